@@ -0,0 +1,191 @@
+"""
+Corpus of pages for benchmark.
+
+Saved pages are read from directory with subdirectories "listing" and
+"item" (files *.html). Without directory synthetic pages are generated.
+"""
+from glob import glob
+import json
+from os import makedirs, path
+import random
+
+
+BASE_URL = 'https://www.zizoo.com/en'
+
+LISTING_TEMPLATE = """<html><body><div class="boats">{cards}</div>
+<div class="pagination">{pagination}</div></body></html>"""
+
+CARD_TEMPLATE = """<div class="boat">
+<a class="boat__figure" href="{url}"><img src="http://img/{slug}.jpg"></a>
+<h3 class="boat__title">{title}</h3>
+<span class="boat__location">{location}</span>
+<span class="boat__price">from &#8364;{price} per week</span></div>"""
+
+ITEM_TEMPLATE = """<html><head><script>
+var boat = {{'boatBanner': '{banner}', 'type': '{type}', 'id': {num}}};
+</script></head><body>
+<h1 class="h2 copy-sp-s">{title}</h1>
+<time itemprop="releaseDate" datetime="{year}">{year}</time>
+<span class="wishlist-btn js-wishlist-toggle boatview__wishlist"
+      data-boat='{data_boat}'></span>
+{stats}
+<div class="card__body card__body--l">
+<p class="p--s copy-sp-m">Check-in: Sat 17:00, {city} Marina Check-out: Sat 09:00, {city} Marina</p>
+<div class="boatview__description"><p>{about}</p></div></div>
+<figure class="item"><img class="img-fluid" src="http://img/{num}/0.jpg"></figure>
+{photos}
+<ul class="boatview__equipment-list">{inventory}</ul>
+<h2 id="equipment">Equipment</h2>
+{equipment}
+<h3 class="h6 copy-sp-m">Obligatory extras</h3><ul>{obligatory}</ul>
+<h3 class="h6 copy-sp-m">Optional extras</h3><ul>{optional}</ul>
+</body></html>"""
+
+STAT_TEMPLATE = """<div class="boatview__stats">
+<span class="boatview__stats-label">{label}</span>
+<span class="boatview__stats-value">{value}</span></div>"""
+
+PRICE_TEMPLATE = """<li class="list__item u-cf"><span>{name}
+<strong>&#8364;{value}</strong></span>
+<span class="boatview__extras-amount">{period}</span></li>"""
+
+CITIES = [('Croatia', 'Split'), ('Greece', 'Athens'), ('Italy', 'Palermo'),
+          ('Spain', 'Ibiza'), ('Turkey', 'Bodrum')]
+
+
+def synthetic_item(num, rnd):
+    """Html of page of boat"""
+    country, city = rnd.choice(CITIES)
+    data_boat = json.dumps({
+        'location': '%s, %s' % (country, city),
+        'length': '%d m' % rnd.randint(8, 30),
+        'guests': rnd.choice([None, rnd.randint(2, 12)]),
+        'cabins': rnd.choice([None, rnd.randint(1, 6)]),
+    })
+    stats = ''.join(
+        STAT_TEMPLATE.format(label=label, value=value)
+        for label, value in [
+            ('Bathrooms', rnd.randint(1, 4)),
+            ('Sleeps', rnd.randint(2, 12)),
+            ('Max. guests', rnd.randint(2, 12)),
+            (rnd.choice(['Sail type', 'Engine']), 'Main %d hp' % num),
+            ('Cabins', rnd.randint(1, 6)),
+            ('Double cabins', rnd.randint(1, 4)),
+        ] + [('Feature %d' % i, i) for i in range(rnd.randint(5, 20))]
+    )
+    photos = ''.join(
+        '<figure class="item"><img class="lazyOwl img-fluid" '
+        'data-src="http://img/%d/%d.jpg"></figure>' % (num, i)
+        for i in range(1, rnd.randint(3, 30))
+    )
+    inventory = ''.join(
+        '<li class="list__item">Inventory %d</li>' % i
+        for i in range(rnd.randint(0, 15))
+    )
+    equipment = ''.join(
+        '<div class="grid__unit"><div class="h6 copy-sp-m">Category %d</div>'
+        '<ul class="list-bulleted">%s</ul></div>' % (i, ''.join(
+            '<li class="list__item">Item %d.%d</li>' % (i, j)
+            for j in range(rnd.randint(1, 8))
+        ))
+        for i in range(rnd.randint(1, 6))
+    )
+
+    def prices(count):
+        return ''.join(
+            PRICE_TEMPLATE.format(
+                name='Extra %d' % i,
+                value='{:,}'.format(rnd.randint(10, 3000)),
+                period=rnd.choice(['per week', 'per day', 'per booking'])
+            )
+            for i in range(count)
+        )
+
+    return ITEM_TEMPLATE.format(
+        banner=rnd.choice(['realtime', 'request']),
+        type=rnd.choice(['Sailing yacht', 'Catamaran', 'Motor boat']),
+        num=num,
+        title='Boat %d &amp; crew' % num,
+        year=rnd.randint(1990, 2018),
+        data_boat=data_boat,
+        stats=stats,
+        city=city,
+        about=' '.join(['Lorem ipsum dolor sit amet.'] * rnd.randint(5, 60)),
+        photos=photos,
+        inventory=inventory,
+        equipment=equipment,
+        obligatory=prices(rnd.randint(1, 6)),
+        optional=prices(rnd.randint(1, 10)),
+    )
+
+
+def synthetic_listing(num, total, items):
+    """Html of listing page with cards of items: list of tuples
+    (url, title, location, price)"""
+    pagination = ''.join(
+        '<a href="/en/b/?page=%d">%d</a>' % (page, page)
+        for page in sorted(set([1, num - 1, num + 1, total]))
+        if 0 < page <= total and page != num
+    )
+    if num < total:
+        pagination += '<a title="Next" href="/en/b/?page=%d">Next</a>' % (
+            num + 1)
+    return LISTING_TEMPLATE.format(
+        cards=''.join(
+            CARD_TEMPLATE.format(url=url, slug=url.split('/')[-1],
+                                 title=title, location=location,
+                                 price=price)
+            for url, title, location, price in items
+        ),
+        pagination=pagination
+    )
+
+
+def synthetic_corpus(items=200, listings=20, seed=0, base_url=BASE_URL):
+    """Tuple of lists (listing pages, item pages) of pairs (url, html).
+    Items are distributed among listing pages"""
+    rnd = random.Random(seed)
+    item_pages = [
+        ('%s/boat/boat-%d' % (base_url, num), synthetic_item(num, rnd))
+        for num in range(items)
+    ]
+    per_page = max(1, -(-items // max(listings, 1)))
+    listing_pages = []
+    for num in range(1, listings + 1):
+        cards = [
+            (url, 'Boat %d' % index, '%s, %s' % CITIES[index % len(CITIES)],
+             '{:,}'.format(500 + index * 37 % 4000))
+            for index, (url, _) in enumerate(
+                item_pages[(num - 1) * per_page:num * per_page],
+                (num - 1) * per_page
+            )
+        ]
+        listing_pages.append((
+            '%s/b/?page=%d' % (base_url, num),
+            synthetic_listing(num, listings, cards)
+        ))
+    return listing_pages, item_pages
+
+
+def load_corpus(directory):
+    """Tuple of lists (listing pages, item pages) from directory"""
+    corpus = []
+    for kind in ('listing', 'item'):
+        pages = []
+        for filename in sorted(glob(path.join(directory, kind, '*.html'))):
+            with open(filename, 'r', encoding='utf-8') as file:
+                slug = path.splitext(path.basename(filename))[0]
+                pages.append(('%s/%s/%s' % (BASE_URL, kind, slug),
+                              file.read()))
+        corpus.append(pages)
+    return tuple(corpus)
+
+
+def save_corpus(directory, corpus):
+    """Save corpus (e.g. synthetic) into directory as fixtures"""
+    for kind, pages in zip(('listing', 'item'), corpus):
+        makedirs(path.join(directory, kind), exist_ok=True)
+        for num, (url, html) in enumerate(pages):
+            filename = path.join(directory, kind, '%05d.html' % num)
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(html)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+Offline benchmark of extraction of pages.
+
+Usage:
+    python -m benchmark.run [--corpus DIR] [--output FILE] [--repeat N]
+                            [--cold-runs N] [--cold-target MS]
+
+Without --corpus synthetic pages are generated. Result (items/sec,
+percentiles of latency per field in milliseconds, cold start and peak RSS)
+is printed and saved into json-file.
+
+Cold start is measured in new interpreters: import of parser (spider with
+all its modules) and extraction of first item. Exit status is 1 when
+median of cold start exceeds target (short runs by cron mostly consist
+of it).
+"""
+import argparse
+from collections import OrderedDict
+import json
+import logging
+from os import path
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from lxml.html import fromstring
+
+from benchmark.corpus import load_corpus, save_corpus, synthetic_corpus
+from extraction.boat_page import BoatPage
+from extraction.listing_page import ListingPage
+
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+# Milliseconds from start of interpreter till first extracted item
+COLD_START_TARGET = 250
+# Is run by new interpreter, page of item is read from stdin
+COLD_START_CODE = """
+import sys, time
+begin = time.perf_counter()
+import parser
+imported = time.perf_counter()
+from extraction.boat_page import extract_html
+url, body = sys.argv[1], sys.stdin.buffer.read()
+boat, errors = extract_html(url, body)
+boat.to_dict()
+print(imported - begin, time.perf_counter() - imported)
+"""
+
+# Fields of item in order of BoatPage.extract
+ITEM_FIELDS = OrderedDict([
+    ('realtime', lambda page, info: page.get_realtime()),
+    ('json_info', lambda page, info: page.get_json_info()),
+    ('title', lambda page, info: page.get_title()),
+    ('year', lambda page, info: page.get_year()),
+    ('guests', lambda page, info: page.get_guests(info)),
+    ('engine', lambda page, info: page.get_engine()),
+    ('sleeps', lambda page, info: page.get_sleeps()),
+    ('cabins', lambda page, info: page.get_cabins(info)),
+    ('about', lambda page, info: page.get_about()),
+    ('photos', lambda page, info: page.get_images_urls()),
+    ('inventory', lambda page, info: page.get_inventory()),
+    ('pickup', lambda page, info: page.get_pickup()),
+    ('equipment', lambda page, info: page.get_equipment()),
+    ('prices', lambda page, info: page.get_prices()),
+])
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Percentiles of values in milliseconds"""
+    if not values:
+        return {}
+    values = sorted(values)
+    result = OrderedDict()
+    for point in points:
+        index = min(len(values) - 1, int(round(point / 100.0 * len(values))))
+        result['p%d' % point] = round(values[index] * 1000, 4)
+    result['max'] = round(values[-1] * 1000, 4)
+    return result
+
+
+def peak_rss():
+    """Peak resident memory of process in megabytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS - bytes
+    if sys.platform == 'darwin':
+        return round(rss / 1024.0 / 1024.0, 2)
+    return round(rss / 1024.0, 2)
+
+
+def bench_items(pages, repeat):
+    """Full extraction and timing of every field of items"""
+    timings = OrderedDict((name, []) for name in ITEM_FIELDS)
+    timings['parse_html'] = []
+    timings['extract'] = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for url, html in pages:
+            begin = time.perf_counter()
+            tree = fromstring(html)
+            timings['parse_html'].append(time.perf_counter() - begin)
+
+            begin = time.perf_counter()
+            page = BoatPage(tree, url, html)
+            try:
+                info = json.loads(page.get_json_info())
+                realtime = page.get_realtime() == 'realtime'
+                page.extract(info, realtime).to_dict()
+            except Exception:
+                errors += 1
+                continue
+            timings['extract'].append(time.perf_counter() - begin)
+
+            # Every field on new page, so results aren't cached
+            page = BoatPage(tree, url, html)
+            for name, func in ITEM_FIELDS.items():
+                begin = time.perf_counter()
+                func(page, info)
+                timings[name].append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    count = len(pages) * repeat
+
+    return OrderedDict([
+        ('pages', count),
+        ('errors', errors),
+        ('items_per_sec', round(
+            len(timings['extract']) / max(
+                sum(timings['extract']) + sum(timings['parse_html']), 1e-9
+            ), 2)),
+        ('elapsed_sec', round(elapsed, 3)),
+        ('latency_ms', OrderedDict(
+            (name, percentiles(values)) for name, values in timings.items()
+        )),
+    ])
+
+
+def bench_listings(pages, repeat):
+    """Extraction of links from listing pages"""
+    timings = []
+    links = 0
+    for _ in range(repeat):
+        for url, html in pages:
+            begin = time.perf_counter()
+            listing = ListingPage(fromstring(html), url)
+            links += len(listing.get_item_urls())
+            listing.get_next_url()
+            timings.append(time.perf_counter() - begin)
+    return OrderedDict([
+        ('pages', len(pages) * repeat),
+        ('links', links),
+        ('pages_per_sec', round(len(timings) / max(sum(timings), 1e-9), 2)),
+        ('latency_ms', percentiles(timings)),
+    ])
+
+
+def bench_cold_start(item, runs, target):
+    """Start of new interpreters which import parser and extract item"""
+    url, html = item
+    imports, first_items, totals = [], [], []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_CODE, url],
+            input=html.encode('utf-8'), stdout=subprocess.PIPE,
+            cwd=ROOT_DIR, check=True
+        ).stdout
+        totals.append(time.perf_counter() - begin)
+        imported, extracted = map(float, output.split())
+        imports.append(imported)
+        first_items.append(extracted)
+    median = percentiles(totals, points=(50,))['p50']
+    return OrderedDict([
+        ('runs', runs),
+        ('import_parser_ms', percentiles(imports, points=(50,))),
+        ('first_item_ms', percentiles(first_items, points=(50,))),
+        ('total_ms', percentiles(totals, points=(50,))),
+        ('target_ms', target),
+        ('passed', median <= target),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--corpus', help='directory with saved pages')
+    parser.add_argument('--items', type=int, default=200,
+                        help='number of synthetic pages of items')
+    parser.add_argument('--listings', type=int, default=20,
+                        help='number of synthetic listing pages')
+    parser.add_argument('--save-corpus',
+                        help='save synthetic pages into directory')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--cold-runs', type=int, default=5,
+                        help='number of cold starts (0 - not measured)')
+    parser.add_argument('--cold-target', type=float,
+                        default=COLD_START_TARGET,
+                        help='target of cold start in milliseconds')
+    args = parser.parse_args(argv)
+
+    # Debug messages of extraction mustn't be measured
+    logging.disable(logging.CRITICAL)
+
+    if args.corpus:
+        listings, items = load_corpus(args.corpus)
+    else:
+        listings, items = synthetic_corpus(args.items, args.listings)
+        if args.save_corpus:
+            save_corpus(args.save_corpus, (listings, items))
+
+    result = OrderedDict([
+        ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_version()),
+        ('corpus', args.corpus or 'synthetic'),
+        ('repeat', args.repeat),
+        ('item', bench_items(items, args.repeat)),
+        ('listing', bench_listings(listings, args.repeat)),
+        ('peak_rss_mb', peak_rss()),
+    ])
+    if args.cold_runs:
+        result['cold_start'] = bench_cold_start(items[0], args.cold_runs,
+                                                args.cold_target)
+
+    with open(args.output, 'w') as file:
+        json.dump(result, file, indent=2)
+    print(json.dumps(result, indent=2))
+    if args.cold_runs and not result['cold_start']['passed']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Local HTTP server with fixture pages for testing of crawler engines.
+
+Usage:
+    python -m benchmark.stub_server [--port PORT] [--corpus DIR]
+
+Listing pages are served at /en/b/?page={NUM}, pages of boats are served
+at /en/boat/{slug}. Without --corpus synthetic pages are generated.
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from urllib.parse import urlsplit
+
+from benchmark.corpus import load_corpus, synthetic_corpus
+
+
+class StubServer(ThreadingHTTPServer):
+    """Server of pages from corpus: dict path -> html"""
+    daemon_threads = True
+
+    def __init__(self, address, pages):
+        self.pages = pages
+        ThreadingHTTPServer.__init__(self, address, StubHandler)
+
+    @property
+    def base_url(self):
+        return 'http://%s:%d/en' % self.server_address[:2]
+
+    def start(self):
+        """Serve in background thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        key = parts.path + ('?' + parts.query if parts.query else '')
+        html = self.server.pages.get(key)
+        if html is None and parts.path == '/en/b/':
+            html = self.server.pages.get('/en/b/?page=1')
+        if html is None:
+            self.send_response(404)
+            body = b'Not found'
+        else:
+            self.send_response(200)
+            body = html.encode('utf-8')
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port=0, corpus=None, items=200, listings=10):
+    """Server with pages of corpus from directory or synthetic pages"""
+    server = StubServer(('127.0.0.1', port), {})
+    if corpus:
+        listing_pages, item_pages = load_corpus(corpus)
+    else:
+        listing_pages, item_pages = synthetic_corpus(
+            items, listings, base_url=server.base_url
+        )
+    for url, html in listing_pages + item_pages:
+        parts = urlsplit(url)
+        key = parts.path + ('?' + parts.query if parts.query else '')
+        server.pages[key] = html
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--corpus', help='directory with saved pages')
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--listings', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.port, args.corpus, args.items, args.listings)
+    print("Serving %d pages at %s/b/" % (len(server.pages), server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
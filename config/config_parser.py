@@ -1,25 +1,43 @@
 from configparser import ConfigParser
 
+from config.options import OPTIONS, conflicts
+
+
+class ConfigError(ValueError):
+    """Values of settings don't correspond to types of options"""
 
-class ConfigReader(ConfigParser):
-    cfg = {}
-    _types_params = {}
 
+class ConfigReader(ConfigParser):
     def __init__(self, *args, **kwargs):
         try:
             self._file = kwargs.pop('file_config')
         except KeyError:
             self._file = 'settings.ini'
+        self._types = kwargs.pop('types', OPTIONS)
         super(ConfigReader, self).__init__(*args, **kwargs)
+        self.cfg = {}
+
+    @property
+    def filename(self):
+        return self._file
 
-    def config_read(self, types_params={}):
+    def reloadable(self, key):
+        """Option can be applied to running crawl"""
+        option = self._types.get(key)
+        return option is not None and option.reload
+
+    def config_read(self):
         """
-        Read from config file to dict in format: {"section: {parameter: value}}
+        Read from config file to dict in format: {parameter: value}.
+        File is read again on every call (for reload of settings)
         """
-        self._types_params = types_params
-
-        self.read(self._file)
+        for section in self.sections():
+            self.remove_section(section)
+        if not self.read(self._file):
+            raise ConfigError("File of settings %s can't be read"
+                              % self._file)
         # Read all sections from config
+        self.cfg = {}
         for section in self.sections():
             for key in self.options(section):
                 self.cfg[key] = self.get(section, key)
@@ -27,24 +45,25 @@ class ConfigReader(ConfigParser):
 
     def check_and_set_config(self):
         """
-        Checking a dict config that corresponds to their types.
-        After, creating the new dict config with valid types variables python.
-
-        Arguments:
-            config dict in format is {parameter: value}
-            dict of typesParams in format is {parameter: 'type variable'}
-            variable can pass follows type: 'bool', 'int', and 'str'
+        Checking a dict config that corresponds to types of options
+        (see config.options). After, creating the new dict config with
+        valid types variables python. All wrong values (and options which
+        can't be used together) are reported by one ConfigError.
         """
         myconfig = {}
+        errors = []
         for key, value in self.cfg.items():
-            value_params = self._types_params.get(key, None)
-            if value_params is not None:
-                if value_params == 'bool':
-                    myconfig[key] = bool(int(self.cfg[key]))
-                elif value_params == 'int':
-                    myconfig[key] = int(self.cfg[key])
-                else:
-                    myconfig[key] = self.cfg[key]
-            else:
-                myconfig[key] = self.cfg[key]
+            option = self._types.get(key)
+            if option is None:
+                myconfig[key] = value
+                continue
+            try:
+                myconfig[key] = option.parse(value)
+            except ValueError as ex:
+                errors.append('%s: %s' % (key, ex))
+        if not errors:
+            errors = conflicts(myconfig)
+        if errors:
+            raise ConfigError("Invalid settings in %s: %s"
+                              % (self._file, '; '.join(errors)))
         return myconfig
@@ -0,0 +1,129 @@
+"""
+Types and allowed values of options of settings.ini.
+
+Options which aren't described here are passed as strings. Options with
+reload=True are applied to running crawl when settings.ini is changed
+(see config.watcher), others are applied after restart.
+"""
+
+
+class Option(object):
+    BOOLEANS = {'1': True, 'yes': True, 'true': True, 'on': True,
+                '0': False, 'no': False, 'false': False, 'off': False}
+
+    def __init__(self, kind='str', choices=None, minimum=None, reload=False):
+        self.kind = kind
+        self.choices = choices
+        self.minimum = minimum
+        self.reload = reload
+
+    def parse(self, value):
+        """Typed value of option. Raises ValueError for wrong value"""
+        if self.kind == 'bool':
+            if value.strip().lower() not in self.BOOLEANS:
+                raise ValueError("%r isn't boolean (0 or 1)" % value)
+            return self.BOOLEANS[value.strip().lower()]
+        if self.kind in ('int', 'float'):
+            try:
+                value = int(value) if self.kind == 'int' else float(value)
+            except ValueError:
+                raise ValueError("%r isn't %s number" % (value, self.kind))
+            if self.minimum is not None and value < self.minimum:
+                raise ValueError("%s is less than %s" % (value,
+                                                         self.minimum))
+            return value
+        if self.choices is not None and value not in self.choices:
+            raise ValueError("%r isn't one of: %s" % (
+                value, ', '.join(repr(choice) for choice in self.choices)
+            ))
+        return value
+
+
+def flag(reload=False):
+    return Option('bool', reload=reload)
+
+
+def number(minimum=0, reload=False):
+    return Option('int', minimum=minimum, reload=reload)
+
+
+def choice(*choices, **kwargs):
+    return Option(choices=choices, reload=kwargs.get('reload', False))
+
+
+OPTIONS = {
+    # MainSettings
+    'engine': choice('grab', 'asyncio'),
+    'numthreads': number(1, reload=True),
+    'maxthreads': number(0),
+    'hostconcurrency': number(1, reload=True),
+    'durablequeue': flag(),
+    'parseprocesses': number(0),
+    'network_try_limit': number(1, reload=True),
+    'parsetrylimit': number(1, reload=True),
+    'retrydelay': number(0, reload=True),
+    'retrymaxdelay': number(0, reload=True),
+    'discovery': choice('next', 'parallel'),
+    'discoverywindow': number(1, reload=True),
+    'rewrite_files': flag(),
+    'incremental': flag(),
+    'maxage': number(0),
+    'maxqueueditems': number(0, reload=True),
+    'seencapacity': number(1),
+    'seenerrorrate': Option('float', minimum=1e-9),
+    'configreload': number(0),
+    # OutputSettings
+    'sink': choice('file', 'ndjson', 'sqlite'),
+    'compression': choice('', 'gzip', 'zstd'),
+    'rotatesize': number(0),
+    'rotateinterval': number(0),
+    'batchsize': number(1),
+    'flushinterval': number(0),
+    # CatalogSettings
+    'catalog': flag(),
+    'catalogitems': choice('all', 'changed', 'none', reload=True),
+    # CacheSettings
+    'usecache': flag(),
+    'cachettlpage': number(0, reload=True),
+    'cachettlitem': number(0, reload=True),
+    'cachemaxsize': number(0),
+    'replay': flag(),
+    # PhotoSettings
+    'downloadphotos': flag(),
+    'photoconcurrency': number(1, reload=True),
+    'photobandwidth': number(0, reload=True),
+    # ProxySettings
+    'useproxy': flag(reload=True),
+    'typeproxy': choice('http', 'socks4', 'socks5', reload=True),
+    'listproxies': Option(reload=True),
+    'periodproxyupdate': number(0, reload=True),
+    'proxyscheduler': flag(reload=True),
+    'proxyconcurrency': number(1, reload=True),
+    'proxybackoff': number(0, reload=True),
+    # WorkerSettings
+    'worker': number(0),
+    'workerlease': number(1),
+    # MetricsSettings
+    'metricsport': number(0),
+    'metricsinterval': number(1, reload=True),
+    # LogSettings
+    'uselog': flag(),
+    'logintofile': flag(),
+    'level': choice('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG',
+                    'NOTSET', reload=True),
+    'logqueue': flag(),
+    'logsample': number(1),
+    'lograte': number(0),
+}
+
+
+def conflicts(config):
+    """Errors of options which can't be used together"""
+    errors = []
+    if config.get('engine') == 'asyncio':
+        if config.get('durablequeue'):
+            errors.append("durablequeue: isn't supported by asyncio engine")
+        if config.get('useproxy') and config.get('typeproxy') != 'http':
+            errors.append("typeproxy: only http proxies are supported by "
+                          "asyncio engine")
+    return errors
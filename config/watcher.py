@@ -0,0 +1,82 @@
+"""
+Reload of settings.ini on running crawl.
+
+File is checked every interval seconds (and at once on SIGHUP). Changed
+options which can be reloaded (see config.options) are passed to
+callback(changes), changes of other options are applied after restart.
+If new settings are invalid, they are ignored till next change of file.
+"""
+import logging
+import os
+import signal
+import threading
+
+from config.config_parser import ConfigError
+
+
+class ConfigWatcher(object):
+    def __init__(self, reader, callback, interval=5):
+        self.reader = reader
+        self.interval = interval
+        self._callback = callback
+        self._values = reader.config_read()
+        self._mtime = self._modified()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        if hasattr(signal, 'SIGHUP') \
+                and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, self._signal)
+        self._thread = threading.Thread(target=self._run,
+                                        name='config-watcher', daemon=True)
+        self._thread.start()
+
+    def _modified(self):
+        try:
+            return os.stat(self.reader.filename).st_mtime
+        except OSError:
+            return None
+
+    def _signal(self, signum, frame):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            forced = self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            mtime = self._modified()
+            if forced or mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
+
+    def reload(self):
+        """Read settings again and apply changed options"""
+        try:
+            values = self.reader.config_read()
+        except ConfigError as ex:
+            logging.error("Settings haven't been reloaded: %s", ex)
+            return
+        changes = dict((key, value) for key, value in values.items()
+                       if self._values.get(key) != value)
+        self._values = values
+        if not changes:
+            return
+        reloaded = dict((key, value) for key, value in changes.items()
+                        if self.reader.reloadable(key))
+        for key in sorted(set(changes) - set(reloaded)):
+            logging.warning("Option %s has been changed, it will be "
+                            "applied after restart", key)
+        if reloaded:
+            logging.info("Options have been changed: %s", ', '.join(
+                '%s=%r' % item for item in sorted(reloaded.items())
+            ))
+            try:
+                self._callback(reloaded)
+            except Exception:
+                logging.exception("Changed options haven't been applied")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
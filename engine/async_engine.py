@@ -0,0 +1,372 @@
+"""
+Crawler engine on asyncio event loop.
+
+Engine runs task handlers of spider (task_initial, task_page, task_item)
+instead of grab.spider.Spider.run. Pages are downloaded by one aiohttp
+session with pool of keep-alive connections, number of requests at once
+is limited in total and per host. Handlers are synchronous, so they are
+run by thread of parsers and event loop isn't blocked while page is
+parsed. Spider is shut down (queued results are saved) on any exit.
+
+Requests go through http proxies of spider (chosen by its scheduler) and
+responses are taken from and saved into local cache of spider as grab
+does it. Durable queue and socks proxies aren't supported (see
+config.options.conflicts).
+"""
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.client import parse_headers
+import io
+import logging
+import time
+from urllib.parse import urljoin, urlsplit
+
+from lxml.html import HTMLParser, fromstring
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncDocument(object):
+    """Subset of grab.document.Document which is used by handlers"""
+
+    def __init__(self, url, code, headers, body, charset):
+        self.url = url
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.charset = charset
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = fromstring(
+                self.body or b'<html></html>',
+                parser=HTMLParser(encoding=self.charset)
+            )
+        return self._tree
+
+    def unicode_body(self):
+        return self.body.decode(self.charset, 'ignore')
+
+
+def parse_head(head):
+    """Headers of the last response from raw head (as cache keeps it)"""
+    if isinstance(head, str):
+        head = head.encode('latin-1')
+    blocks = [block for block in head.split(b'\r\n\r\n') if block.strip()]
+    if not blocks:
+        return parse_headers(io.BytesIO(b'\r\n'))
+    lines = blocks[-1].split(b'\r\n', 1)
+    return parse_headers(io.BytesIO(
+        (lines[1] if len(lines) > 1 else b'') + b'\r\n\r\n'
+    ))
+
+
+def make_head(doc):
+    """Raw head of response for cache"""
+    lines = ['HTTP/1.1 %d' % doc.code]
+    lines.extend('%s: %s' % (name, value)
+                 for name, value in doc.headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+
+class AsyncResponse(object):
+    """Subset of grab.Grab which is passed into handlers"""
+
+    def __init__(self, task, doc):
+        self.doc = doc
+        self.config = {'url': task.url}
+
+    def make_url_absolute(self, url):
+        return urljoin(self.doc.url, url)
+
+
+class AsyncEngine(object):
+    """
+    Run spider on asyncio event loop.
+
+    concurrency - max number of requests at once,
+    per_host - max number of requests at once to one host.
+    Both can be changed on running crawl by set_limits.
+    parsers - number of threads which run handlers of spider.
+    """
+
+    def __init__(self, spider, concurrency=100, per_host=10, timeout=30,
+                 parsers=1):
+        if aiohttp is None:
+            raise ImportError("Package aiohttp is required for asyncio engine")
+        self.spider = spider
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.parsers = parsers
+        self._executor = None
+        self.counters = defaultdict(int)
+        self._loop = None
+        self._queue = None
+        self._scheduled = 0
+        self._hosts = {}
+        self._session = None
+        # Number of worker -> its future
+        self._workers = {}
+
+    def add_task(self, task):
+        """Add task into queue. Can be called from any thread"""
+        if not task.url.startswith(('http://', 'https://')):
+            logging.error("Task with invalid url: %s", task.url)
+            return False
+        self._loop.call_soon_threadsafe(self._put, task)
+        return True
+
+    def set_limits(self, concurrency=None, per_host=None):
+        """Change limits of requests. Can be called from any thread"""
+        self._loop.call_soon_threadsafe(self._set_limits, concurrency,
+                                        per_host)
+
+    def _set_limits(self, concurrency, per_host):
+        if per_host is not None and per_host != self.per_host:
+            self.per_host = per_host
+            # Requests which are active release previous semaphores
+            self._hosts = {}
+        if concurrency is not None:
+            self.concurrency = concurrency
+            self._start_workers()
+
+    def _start_workers(self):
+        """Workers with numbers above concurrency stop after their tasks"""
+        for index in range(self.concurrency):
+            worker = self._workers.get(index)
+            if worker is None or worker.done():
+                self._workers[index] = asyncio.ensure_future(
+                    self._worker(self._session, index)
+                )
+
+    def _put(self, task):
+        delay = 0
+        if task.schedule_time is not None:
+            delay = (task.schedule_time - datetime.utcnow()).total_seconds()
+        if delay > 0:
+            self._scheduled += 1
+            self._loop.call_later(delay, self._put_scheduled, task)
+        else:
+            self._queue.put_nowait(task)
+
+    def _put_scheduled(self, task):
+        self._scheduled -= 1
+        self._queue.put_nowait(task)
+
+    def _host_slots(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    def _proxy(self, task):
+        """Proxy of spider for request or None. Task is passed here when
+        scheduler of proxies has free one (see MySpider.proxy_delay)"""
+        if not self.spider.proxylist_enabled or not task.use_proxylist:
+            return None
+        self.spider.change_active_proxy(task, None)
+        return self.spider.proxy
+
+    def _report(self, proxy, doc, latency):
+        """Pass result of request through proxy to scheduler of spider"""
+        scheduler = self.spider.proxy_scheduler
+        if proxy is None or scheduler is None:
+            return
+        if doc is None:
+            scheduler.report(proxy.get_address(), False)
+        else:
+            scheduler.report(proxy.get_address(), True, latency=latency,
+                             code=doc.code)
+
+    async def _cached(self, task):
+        """Document from cache of spider or None"""
+        cache = self.spider.response_cache
+        if cache is None or task.get('refresh_cache') \
+                or task.get('disable_cache'):
+            return None
+        item = await self._loop.run_in_executor(
+            None, cache.get_item, task.url, task.get('cache_timeout')
+        )
+        if item is None:
+            return None
+        headers = parse_head(item['head'])
+        return AsyncDocument(item['response_url'], item['response_code'],
+                             headers, item['body'],
+                             headers.get_content_charset() or 'utf-8')
+
+    async def _save(self, task, doc):
+        """Save response into cache of spider"""
+        cache = self.spider.response_cache
+        if cache is None or task.get('disable_cache') or doc.code != 200:
+            return
+        await self._loop.run_in_executor(None, cache.set_item, task.url, {
+            'url': task.url,
+            'response_url': doc.url,
+            'body': doc.body,
+            'head': make_head(doc),
+            'response_code': doc.code,
+            'cookies': None,
+        })
+
+    async def _fetch(self, session, task, proxy=None):
+        headers = {}
+        if task.grab_config:
+            headers.update(task.grab_config.get('headers') or {})
+        options = {}
+        if proxy is not None:
+            options['proxy'] = 'http://%s' % proxy.get_address()
+            if proxy.username:
+                options['proxy_auth'] = aiohttp.BasicAuth(
+                    proxy.username, proxy.password or ''
+                )
+        async with self._host_slots(task.url):
+            async with session.get(task.url, headers=headers,
+                                   **options) as response:
+                body = await response.read()
+                return AsyncDocument(
+                    str(response.url),
+                    response.status,
+                    response.headers,
+                    body,
+                    response.charset or 'utf-8'
+                )
+
+    async def _process(self, session, task):
+        if task.task_try_count > self.spider.task_try_limit \
+                or task.network_try_count > self.spider.network_try_limit:
+            logging.info("Task %s is rejected by limits: %s", task.name,
+                         task.url)
+            self.counters['task-rejected'] += 1
+            fallback = getattr(self.spider, 'task_%s_fallback' % task.name,
+                               None)
+            if fallback is not None:
+                fallback(task)
+            return
+
+        doc = await self._cached(task)
+        if doc is not None:
+            task.network_try_count += 1
+            self.counters['cache-hit'] += 1
+            self.spider.count_response('cache')
+        elif self.spider.only_cache:
+            logging.debug("Page isn't found in cache: %s", task.url)
+            self.counters['cache-miss'] += 1
+            return
+        else:
+            delay = self.spider.proxy_delay(task)
+            if delay:
+                # Every proxy is paused or busy
+                self.counters['proxy-wait'] += 1
+                task.process_delay_option(delay)
+                self._put(task)
+                return
+            task.network_try_count += 1
+            doc = await self._download(session, task)
+            if doc is not None:
+                await self._save(task, doc)
+
+        if doc is None or not (doc.code < 400 or doc.code == 404):
+            self.counters['network-error'] += 1
+            self._put(task.clone(task_try_count=task.task_try_count,
+                                 network_try_count=task.network_try_count))
+            return
+
+        self.counters['task-%s' % task.name] += 1
+        handler = getattr(self.spider, 'task_%s' % task.name)
+        new_tasks = await self._loop.run_in_executor(
+            self._executor, self._handle, handler, AsyncResponse(task, doc),
+            task
+        )
+        for new_task in new_tasks:
+            self._put(new_task)
+
+    async def _download(self, session, task):
+        """Document from network or None on network error"""
+        proxy = self._proxy(task)
+        started = time.perf_counter()
+        try:
+            with self.spider.metrics.time('download'):
+                doc = await self._fetch(session, task, proxy)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            logging.debug("Network error %r for: %s", ex, task.url)
+            doc = None
+        self._report(proxy, doc, time.perf_counter() - started)
+        self.counters['request'] += 1
+        self.spider.count_response(doc.code if doc is not None else 'error')
+        return doc
+
+    @staticmethod
+    def _handle(handler, response, task):
+        """Run handler in thread of parsers. Returns list of new tasks"""
+        result = handler(response, task)
+        if result is None:
+            return []
+        return list(result)
+
+    async def _worker(self, session, index):
+        while index < self.concurrency:
+            task = await self._queue.get()
+            try:
+                await self._process(session, task)
+            except Exception:
+                self.counters['handler-error'] += 1
+                logging.exception("Error in handler of task %s: %s", task.name,
+                                  task.url)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.parsers,
+                                            thread_name_prefix='parser')
+        self.spider.async_engine = self
+        self.spider.prepare()
+        try:
+            for task in self.spider.task_generator():
+                self._put(task)
+            await self._crawl()
+        finally:
+            # On ^C or error of engine handlers are finished and results
+            # which are waiting in writer are saved
+            for worker in self._workers.values():
+                worker.cancel()
+            await asyncio.gather(*self._workers.values(),
+                                 return_exceptions=True)
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self.spider.shutdown()
+
+    async def _crawl(self):
+        # Requests are limited by workers and semaphores of hosts
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            self._session = session
+            self._start_workers()
+            # Work is done when queue is empty, no delayed tasks
+            # and spider doesn't wait for something (e.g. pool of parsing)
+            while True:
+                await self._queue.join()
+                if self._scheduled or self.spider.has_pending_items():
+                    await asyncio.sleep(0.1)
+                    continue
+                if self._queue.empty():
+                    break
+
+    def run(self):
+        started = time.time()
+        asyncio.run(self._run())
+        self.counters['elapsed'] = round(time.time() - started, 2)
+
+    def render_stats(self):
+        return '\n'.join('%s: %s' % (key, value)
+                         for key, value in sorted(self.counters.items()))
@@ -0,0 +1,264 @@
+"""
+Coordination of several workers (processes of parser) of one crawl.
+
+Workers share SQLite file where they claim listing pages and items:
+
+- page 1 is parsed by every worker, next listing pages are claimed one by
+  one (?page={NUM}, not by link "Next"), so every page is parsed by one
+  worker and fast workers take more pages;
+- item is parsed only by the worker which has claimed it first, so two
+  workers never parse and save the same item.
+
+Every worker updates its heartbeat. Pages which haven't been done by
+worker which has stopped (or hasn't updated heartbeat for lease seconds)
+are claimed by other workers. Page which hasn't been downloaded is
+returned for claim by any worker, after PAGE_TRIES returns it's lost. File
+keeps state of one crawl: it must be removed before next crawl.
+
+All workers run on one host and the file is on its local disk: SQLite in
+WAL mode (as results, state and queues) uses shared memory and locks
+which don't work through network filesystems, so database can be
+corrupted. Worker doesn't start if file is used by workers of other host.
+So crawl scales by processes of one machine, scaling across machines
+isn't supported (it would need coordinator with network address and
+results of every worker in own directory).
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker INTEGER PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started REAL,
+    seen REAL,
+    stopped INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pages (
+    num INTEGER PRIMARY KEY,
+    worker INTEGER,
+    claimed REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    released INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pages_done ON pages (done, worker);
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    worker INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+# Times listing page is returned by workers which haven't downloaded it
+PAGE_TRIES = 3
+# Workers which can't finish their claims
+LOST = ('SELECT worker FROM workers WHERE stopped = 1 OR seen < ?')
+
+
+class Transaction(object):
+    """BEGIN IMMEDIATE ... COMMIT (or ROLLBACK on error)"""
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._lock.release()
+
+
+class Coordinator(object):
+    """Claims of pages and items of worker in shared SQLite file"""
+
+    def __init__(self, filename, worker, lease=300):
+        self.worker = worker
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=60,
+                                     check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        host = socket.gethostname()
+        with self._transaction():
+            now = time.time()
+            # Workers of other hosts which are running
+            hosts = [row[0] for row in self._conn.execute(
+                'SELECT DISTINCT host FROM workers WHERE host != ? '
+                'AND stopped = 0 AND seen >= ?', (host, now - lease)
+            )]
+            if not hosts:
+                self._conn.execute(
+                    'INSERT INTO workers (worker, host, pid, started, seen) '
+                    'VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (worker) DO UPDATE SET '
+                    'host = excluded.host, pid = excluded.pid, '
+                    'started = excluded.started, seen = excluded.seen, '
+                    'stopped = 0',
+                    (worker, host, os.getpid(), now, now)
+                )
+                # Pages of previous run of this worker are claimed again
+                restored = self._conn.execute(
+                    'UPDATE pages SET worker = NULL '
+                    'WHERE worker = ? AND done = 0', (worker,)
+                ).rowcount
+        if hosts:
+            self._conn.close()
+            raise RuntimeError("File %s is used by workers on other hosts "
+                               "(%s), all workers must run on one host"
+                               % (filename, ', '.join(hosts)))
+        if restored:
+            logging.info("%d listing pages of previous run of worker %d "
+                         "will be parsed again", restored, worker)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='coordinator', daemon=True)
+        self._thread.start()
+
+    def _transaction(self):
+        """Write transaction: workers don't claim the same row at once"""
+        return Transaction(self._conn, self._lock)
+
+    def _run(self):
+        while not self._stop.wait(self.lease / 3):
+            self.heartbeat()
+
+    def heartbeat(self):
+        try:
+            with self._transaction():
+                self._conn.execute(
+                    'UPDATE workers SET seen = ? WHERE worker = ?',
+                    (time.time(), self.worker)
+                )
+        except sqlite3.Error:
+            logging.exception("Heartbeat of worker hasn't been saved")
+
+    def set_total(self, total):
+        """Number of listing pages found by pagination"""
+        with self._transaction():
+            self._conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('total', total)
+            )
+
+    def claim_page(self):
+        """Number of next listing page for this worker or None if all
+        pages are claimed"""
+        with self._transaction():
+            now = time.time()
+            row = self._conn.execute(
+                'SELECT num FROM pages WHERE done = 0 AND (worker IS NULL '
+                'OR worker IN (' + LOST + ')) ORDER BY num LIMIT 1',
+                (now - self.lease,)
+            ).fetchone()
+            if row is not None:
+                num = row[0]
+                self._conn.execute(
+                    'UPDATE pages SET worker = ?, claimed = ? WHERE num = ?',
+                    (self.worker, now, num)
+                )
+                logging.debug("Listing page %d is taken over by worker %d",
+                              num, self.worker)
+                return num
+
+            num = self._conn.execute(
+                'SELECT COALESCE(MAX(num), 1) + 1 FROM pages'
+            ).fetchone()[0]
+            limit = self._conn.execute(
+                "SELECT MIN(value) FROM meta WHERE key IN ('total', 'last')"
+            ).fetchone()[0]
+            if limit is not None and num > limit:
+                return None
+            self._conn.execute(
+                'INSERT INTO pages (num, worker, claimed) VALUES (?, ?, ?)',
+                (num, self.worker, now)
+            )
+            return num
+
+    def page_done(self, num, empty=False):
+        """Listing page has been parsed. Pages after empty page aren't
+        claimed (when number of pages is unknown)"""
+        with self._transaction():
+            self._conn.execute(
+                'UPDATE pages SET done = 1 WHERE num = ?', (num,)
+            )
+            if empty:
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('last', ?) "
+                    "ON CONFLICT (key) DO UPDATE SET "
+                    "value = MIN(value, excluded.value)", (num - 1,)
+                )
+
+    def release_page(self, num):
+        """Listing page hasn't been downloaded by this worker: it can be
+        claimed again. Returns False if it has been returned PAGE_TRIES
+        times and is done (lost)"""
+        with self._transaction():
+            self._conn.execute(
+                'UPDATE pages SET worker = NULL, released = released + 1 '
+                'WHERE num = ?', (num,)
+            )
+            released = self._conn.execute(
+                'SELECT released FROM pages WHERE num = ?', (num,)
+            ).fetchone()
+            if released is None or released[0] < PAGE_TRIES:
+                return True
+            self._conn.execute(
+                'UPDATE pages SET done = 1 WHERE num = ?', (num,)
+            )
+            return False
+
+    def claim_items(self, ids):
+        """Set of ids which are parsed by this worker: ids claimed now,
+        earlier by this worker or by worker which can't finish them"""
+        ids = list(ids)
+        if not ids:
+            return set()
+        with self._transaction():
+            self._conn.executemany(
+                'INSERT INTO items (id, worker) VALUES (?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET worker = excluded.worker '
+                'WHERE items.worker IN (' + LOST + ')',
+                [(file_id, self.worker, time.time() - self.lease)
+                 for file_id in ids]
+            )
+            owned = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                owned.update(row[0] for row in self._conn.execute(
+                    'SELECT id FROM items WHERE worker = ? AND id IN (%s)'
+                    % ', '.join('?' * len(chunk)), [self.worker] + chunk
+                ))
+        return owned
+
+    def close(self):
+        """Stop heartbeat. Claims of stopped worker can be taken over"""
+        self._stop.set()
+        self._thread.join()
+        with self._transaction():
+            self._conn.execute(
+                'UPDATE workers SET seen = ?, stopped = 1 WHERE worker = ?',
+                (time.time(), self.worker)
+            )
+        with self._lock:
+            self._conn.close()
+
@@ -0,0 +1,142 @@
+"""
+Frontier of crawl: items which have been queued and backpressure of
+listing pages.
+
+Ids of queued items are remembered by Bloom filter of fixed size, so
+memory doesn't grow on long crawls. Id is kept in memory only while item
+is in flight: from queueing till it's saved or given up (finished).
+Filter can answer "seen" for new id (false positive), so it's confirmed
+exactly: id is in flight or function confirm says that item has been
+parsed in this run (by persistent index or state, see
+MySpider.parsed_in_run). Otherwise item is queued again, so false
+positive isn't lost.
+
+When max_queued items are waiting, next listing page isn't queued but
+is held till half of them are taken by task_item.
+"""
+from collections import deque
+from hashlib import blake2b
+import logging
+import math
+import threading
+
+
+class BloomFilter(object):
+    """Set of strings in fixed memory. When capacity strings are added
+    false positives happen with probability error_rate"""
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Positions by double hashing of one digest
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size
+                for index in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def add(self, key):
+        """Add key. Returns False if it's (probably) added already"""
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class Frontier(object):
+    def __init__(self, seen, confirm=None, max_queued=0, metrics=None):
+        self.max_queued = max_queued
+        self.metrics = metrics
+        self._seen = seen
+        self._confirm = confirm
+        # Ids of items which are waiting in queue
+        self._pending = set()
+        # Ids of items which have been taken from queue, but aren't saved
+        self._active = set()
+        self._held = deque()
+        self._lock = threading.Lock()
+
+    def add(self, file_id):
+        """Register item before it's queued. Returns False if the item
+        has been queued already"""
+        with self._lock:
+            duplicate = file_id in self._pending or file_id in self._active \
+                or (file_id in self._seen and self._confirm is not None
+                    and self._confirm(file_id))
+            if not duplicate:
+                self._seen.add(file_id)
+                self._pending.add(file_id)
+            self._update_metrics(duplicate)
+        if duplicate:
+            logging.debug("Item has been queued already: %s", file_id)
+        return not duplicate
+
+    def started(self, file_id):
+        """Item has been taken from queue. Returns held listing pages
+        which can be queued now"""
+        with self._lock:
+            self._pending.discard(file_id)
+            self._active.add(file_id)
+            self._update_metrics()
+        return self.release()
+
+    def finished(self, file_id):
+        """Item has been saved or given up (it isn't in flight)"""
+        with self._lock:
+            self._active.discard(file_id)
+            self._update_metrics()
+
+    def is_full(self):
+        return bool(self.max_queued) and len(self._pending) >= self.max_queued
+
+    def hold(self, task):
+        """Keep task of listing page till queue of items decreases"""
+        with self._lock:
+            self._held.append(task)
+        logging.debug("Listing page is held, %d items are waiting: %s",
+                      len(self._pending), task.url)
+
+    @property
+    def held(self):
+        return len(self._held)
+
+    def release(self, force=False):
+        """Held tasks if queue of items is half empty (or at once)"""
+        with self._lock:
+            if not self._held or not force \
+                    and len(self._pending) > self.max_queued // 2:
+                return []
+            tasks = list(self._held)
+            self._held.clear()
+        return tasks
+
+    def _update_metrics(self, duplicate=False):
+        if self.metrics is None:
+            return
+        if duplicate:
+            self.metrics.counter(
+                'frontier_duplicates_total', "Items which have been queued "
+                "from several listing pages"
+            ).inc()
+        self.metrics.gauge(
+            'frontier_pending', "Items which are waiting in queue"
+        ).set(len(self._pending))
+        self.metrics.gauge(
+            'frontier_active', "Items which are parsed or saved now"
+        ).set(len(self._active))
@@ -0,0 +1,163 @@
+"""
+Downloading of photos of boats by spider.
+
+Item with photos isn't saved at once: every url of boat.photos becomes
+task 'photo' (one task per url even if photo belongs to several items)
+and when all photos of item are done, urls are replaced with local paths
+(see storage.photo_store) and item is passed to callback for saving
+with task of item (it isn't done till item is saved). Photo which hasn't
+been downloaded keeps its url.
+
+Photos don't starve pages: tasks have low priority, no more than
+concurrency photos are requested at once and, if bandwidth is set,
+next photos are delayed while downloaded bytes exceed bandwidth per second.
+"""
+from collections import deque, OrderedDict
+import logging
+import threading
+import time
+
+from grab.spider import Task
+
+from storage.photo_store import photo_extension
+
+
+class PhotoPipeline(object):
+    def __init__(self, store, callback, concurrency=4, bandwidth=0,
+                 priority=200, known_size=10000, metrics=None):
+        self.store = store
+        self.concurrency = max(concurrency, 1)
+        self.bandwidth = bandwidth
+        self.priority = priority
+        self.metrics = metrics
+        self._callback = callback
+        # file_id -> [boat, number of photos which are waited, task]
+        self._items = {}
+        # url -> list of (file_id, index in boat.photos)
+        self._waiters = {}
+        self._queue = deque()
+        self._requested = set()
+        # Local paths of recently downloaded urls
+        self._known = OrderedDict()
+        self._known_size = known_size
+        self._allowance = bandwidth
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_id):
+        with self._lock:
+            return file_id in self._items
+
+    def add(self, file_id, boat, task=None):
+        """Register item and return tasks for its photos. Item without
+        photos (or with known ones) is passed to callback at once"""
+        with self._lock:
+            if file_id in self._items:
+                logging.debug("Photos of %s are being downloaded already",
+                              file_id)
+                return []
+            photos = boat.photos = list(boat.photos or [])
+            waiting = 0
+            for index, url in enumerate(photos):
+                if url in self._known:
+                    photos[index] = self._known[url]
+                    continue
+                waiting += 1
+                if url not in self._waiters:
+                    self._waiters[url] = []
+                    self._queue.append(url)
+                self._waiters[url].append((file_id, index))
+            if waiting:
+                self._items[file_id] = [boat, waiting, task]
+            tasks = self._release()
+        if not waiting:
+            self._callback(file_id, boat, task)
+        return tasks
+
+    def done(self, task, body=None, content_type=None):
+        """Photo has been downloaded (body is None if it has failed).
+        Returns tasks for next photos"""
+        local = None
+        if body is not None:
+            local, created = self.store.save(
+                body, photo_extension(task.url, content_type)
+            )
+            if self.metrics is not None:
+                self.metrics.counter(
+                    'photos_total', "Downloaded photos"
+                ).inc(duplicate=str(not created).lower())
+                self.metrics.counter(
+                    'photo_bytes_total', "Bytes of downloaded photos"
+                ).inc(len(body))
+        else:
+            logging.warning("Photo hasn't been downloaded: %s", task.url)
+
+        completed = []
+        with self._lock:
+            self._requested.discard(task.url)
+            if body is not None:
+                self._consume(len(body))
+            if local is not None:
+                self._known[task.url] = local
+                if len(self._known) > self._known_size:
+                    self._known.popitem(last=False)
+            for file_id, index in self._waiters.pop(task.url, []):
+                item = self._items.get(file_id)
+                if item is None:
+                    continue
+                if local is not None:
+                    item[0].photos[index] = local
+                item[1] -= 1
+                if not item[1]:
+                    del self._items[file_id]
+                    completed.append((file_id, item[0], item[2]))
+            tasks = self._release()
+        for file_id, boat, item_task in completed:
+            self._callback(file_id, boat, item_task)
+        return tasks
+
+    def is_idle(self):
+        with self._lock:
+            return not self._items
+
+    def flush(self):
+        """Pass items which wait for photos to callback as they are"""
+        with self._lock:
+            items = list(self._items.items())
+            self._items.clear()
+            self._waiters.clear()
+            self._queue.clear()
+        if items:
+            logging.info("%d items are saved without some photos",
+                         len(items))
+        for file_id, (boat, _, task) in items:
+            self._callback(file_id, boat, task)
+
+    def _refill(self):
+        """Bytes which can be downloaded now (token bucket)"""
+        now = time.monotonic()
+        self._allowance = min(
+            self.bandwidth,
+            self._allowance + (now - self._updated) * self.bandwidth
+        )
+        self._updated = now
+
+    def _consume(self, size):
+        if self.bandwidth:
+            self._refill()
+            self._allowance -= size
+
+    def _release(self):
+        """Tasks for waiting photos while limit of concurrency allows"""
+        tasks = []
+        if self.bandwidth:
+            self._refill()
+        while self._queue and len(self._requested) < self.concurrency:
+            url = self._queue.popleft()
+            self._requested.add(url)
+            delay = 0
+            if self.bandwidth and self._allowance < 0:
+                delay = -self._allowance / self.bandwidth
+            tasks.append(Task('photo', url=url, priority=self.priority,
+                              disable_cache=True, delay=delay))
+        return tasks
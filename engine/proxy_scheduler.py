@@ -0,0 +1,142 @@
+"""
+Scheduler of proxies by their health.
+
+For every proxy keeps latency (exponential moving average), rate of errors
+and number of requests at once. Requests go to the healthy proxy with the
+best score. Limit of requests at once is controlled by AIMD: it grows by
+1/limit after success and is halved after error or ban. Failing proxy is
+paused for backoff seconds, which doubles after every error in a row.
+When every proxy is paused or has limit of requests at once, no proxy is
+given: request waits for delay seconds.
+"""
+import logging
+import threading
+import time
+
+
+# Response codes which mean that site has banned proxy
+BAN_CODES = (403, 407, 429, 503)
+# Seconds of waiting for proxy which has limit of requests at once
+BUSY_DELAY = 0.5
+
+
+class ProxyStats(object):
+    __slots__ = ('proxy', 'latency', 'requests', 'errors', 'errors_in_row',
+                 'limit', 'inflight', 'paused_till')
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.errors_in_row = 0
+        self.limit = 1.0
+        self.inflight = 0
+        self.paused_till = 0
+
+    def score(self):
+        """Less is better. Proxies without statistics are tried first"""
+        if self.latency is None:
+            return 0
+        error_rate = float(self.errors) / max(self.requests, 1)
+        return self.latency * (1 + 4 * error_rate)
+
+
+class ProxyScheduler(object):
+    def __init__(self, max_concurrency=8, backoff=30, max_backoff=1800,
+                 smoothing=0.3):
+        self.max_concurrency = max_concurrency
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.smoothing = smoothing
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def update(self, proxies):
+        """Set new list of proxies. Statistics of known proxies are kept"""
+        with self._lock:
+            stats = {}
+            for proxy in proxies:
+                address = proxy.get_address()
+                stats[address] = self._stats.get(address) \
+                    or ProxyStats(proxy)
+                stats[address].proxy = proxy
+            self._stats = stats
+        logging.info("Proxy scheduler has %d proxies", len(stats))
+
+    def acquire(self):
+        """Proxy for next request or None if list is empty or every proxy
+        is paused or busy (see delay)"""
+        now = time.time()
+        with self._lock:
+            free = [item for item in self._stats.values()
+                    if item.paused_till <= now and item.inflight < item.limit]
+            if not free:
+                return None
+            best = min(free, key=ProxyStats.score)
+            best.inflight += 1
+            return best.proxy
+
+    def delay(self):
+        """Seconds till a proxy can be acquired: 0 if one is free (or list
+        is empty), else till the nearest end of pause or BUSY_DELAY"""
+        now = time.time()
+        waits = []
+        with self._lock:
+            for item in self._stats.values():
+                if item.paused_till > now:
+                    waits.append(item.paused_till - now)
+                elif item.inflight < item.limit:
+                    return 0
+                else:
+                    waits.append(BUSY_DELAY)
+        return min(waits) if waits else 0
+
+    def release(self, address):
+        """Proxy has been acquired but request hasn't been sent (response
+        is taken from cache)"""
+        with self._lock:
+            item = self._stats.get(address)
+            if item is not None:
+                item.inflight = max(item.inflight - 1, 0)
+
+    def report(self, address, ok, latency=None, code=None):
+        """Result of request through proxy with address"""
+        with self._lock:
+            item = self._stats.get(address)
+            if item is None:
+                return
+            item.inflight = max(item.inflight - 1, 0)
+            item.requests += 1
+            if ok and code not in BAN_CODES:
+                item.errors_in_row = 0
+                item.limit = min(item.limit + 1.0 / item.limit,
+                                 self.max_concurrency)
+                if latency is not None:
+                    if item.latency is None:
+                        item.latency = latency
+                    else:
+                        item.latency += self.smoothing * (latency -
+                                                          item.latency)
+            else:
+                item.errors += 1
+                item.errors_in_row += 1
+                item.limit = max(item.limit / 2.0, 1.0)
+                pause = min(self.backoff * 2 ** (item.errors_in_row - 1),
+                            self.max_backoff)
+                item.paused_till = time.time() + pause
+                logging.debug("Proxy %s is paused for %d sec (code: %s)",
+                              address, pause, code)
+
+    def render_stats(self):
+        with self._lock:
+            items = sorted(self._stats.values(), key=ProxyStats.score)
+            return '\n'.join(
+                '%s: requests=%d errors=%d latency=%s limit=%.1f' % (
+                    item.proxy.get_address(), item.requests, item.errors,
+                    '%.3f' % item.latency if item.latency is not None
+                    else '-',
+                    item.limit
+                )
+                for item in items
+            )
@@ -0,0 +1,92 @@
+"""
+Policy of repeating of tasks which pages have not been parsed.
+
+Failures are transient (page is incomplete or it isn't a page of boat,
+e.g. captcha: it's worth to repeat it later) or permanent (page doesn't
+exist or data of boat is invalid). Transient ones are repeated with
+exponential backoff and jitter as delayed tasks, only one repeat of url
+can wait in queue. Permanent failures and urls which have
+failed max_tries times are written into dead-letter file (json-lines).
+Number of repeats and failures is counted by metrics (if they're given).
+"""
+from datetime import datetime
+import json
+import logging
+import random
+import threading
+
+from grab.spider import Task
+
+
+class RetryPolicy(object):
+    def __init__(self, max_tries=5, delay=10, max_delay=600,
+                 dead_letter=None, metrics=None):
+        self.max_tries = max_tries
+        self.delay = delay
+        self.max_delay = max_delay
+        self._dead_letter = dead_letter
+        self.metrics = metrics
+        self._waiting = set()
+        self._lock = threading.Lock()
+
+    def backoff(self, tries):
+        """Delay in seconds before try with number tries + 1"""
+        delay = min(self.delay * 2 ** (tries - 1), self.max_delay)
+        return delay * random.uniform(0.5, 1.5)
+
+    def started(self, url):
+        """Task of url is processed, so next repeat can be scheduled"""
+        with self._lock:
+            self._waiting.discard(url)
+
+    def is_waiting(self, url):
+        """Repeat of url is waiting in queue"""
+        with self._lock:
+            return url in self._waiting
+
+    def retry(self, task, reason, permanent=False):
+        """Task for repeat or None if url mustn't be repeated"""
+        if permanent or task.task_try_count >= self.max_tries:
+            self.fail(task, reason, permanent)
+            return None
+
+        with self._lock:
+            if task.url in self._waiting:
+                logging.debug("Repeat of %s is already scheduled", task.url)
+                return None
+            self._waiting.add(task.url)
+
+        if self.metrics is not None:
+            self.metrics.counter(
+                'item_retries_total', "Repeats of tasks of items"
+            ).inc()
+        delay = self.backoff(task.task_try_count)
+        logging.info("Repeat %s in %.1f sec (try %d): %s", task.url, delay,
+                     task.task_try_count + 1, reason)
+        return Task(task.name, url=task.url,
+                    task_try_count=task.task_try_count + 1,
+                    refresh_cache=True, delay=delay, page=task.get('page'),
+                    card_changed=task.get('card_changed', False))
+
+    def fail(self, task, reason, permanent=False):
+        """Write url into dead-letter file"""
+        logging.warning("Url is given up after %d tries (%s): %s",
+                        task.task_try_count, reason, task.url)
+        if self.metrics is not None:
+            self.metrics.counter(
+                'item_failures_total', "Items which have been given up"
+            ).inc(permanent=str(permanent).lower())
+        if self._dead_letter is None:
+            return
+        line = json.dumps({
+            'url': task.url,
+            'task': task.name,
+            'reason': reason,
+            'permanent': permanent,
+            'tries': task.task_try_count,
+            'page': task.get('page'),
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self._dead_letter, 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
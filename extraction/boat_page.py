@@ -0,0 +1,351 @@
+from collections import OrderedDict
+from datetime import datetime
+from html import unescape
+import json
+import logging
+import re
+
+from lxml.html import HTMLParser, fromstring
+from weblib.error import DataNotFound
+
+from extraction import xpaths
+from extraction.models import Boat, Location, Pickup, Price
+
+
+def normalize_space(value):
+    """Replace sequences of spaces with one space and strip it"""
+    return xpaths.RE_SPACE.sub(' ', value).strip()
+
+
+def node_text(node, normalize=True):
+    """Text of element or of string result of xpath"""
+    if isinstance(node, str):
+        value = str(node)
+    else:
+        value = node.text_content()
+    return normalize_space(value) if normalize else value
+
+
+class BoatPage(object):
+    """
+    Extracting information about boat from parsed page.
+
+    Each XPath is compiled once (see extraction.xpaths) and all labels
+    of boatview stats are read for one pass over the document.
+    """
+    # Helpers which extract fields (their duration is measured by metrics)
+    HELPERS = ('get_realtime', 'get_json_info', 'get_title', 'get_year',
+               'get_guests', 'get_engine', 'get_sleeps', 'get_cabins',
+               'get_stats', 'get_about', 'get_images_urls', 'get_inventory',
+               'get_pickup', 'get_equipment', 'get_prices')
+
+    def __init__(self, tree, url, body):
+        self.tree = tree
+        self.url = url
+        self.body = body
+        self._stats = None
+
+    def rex_text(self, regexp, flags=0):
+        """Search regexp in body of page like grab.doc.rex_text"""
+        if isinstance(regexp, str):
+            regexp = re.compile(regexp, flags)
+        match = regexp.search(self.body)
+        if match is None:
+            raise DataNotFound("Could not find regexp: %s" % regexp.pattern)
+        return normalize_space(unescape(match.group(1)))
+
+    def get_realtime(self):
+        """Parsing boatBanner for realtime availability"""
+        return self.rex_text(xpaths.RE_BOAT_BANNER)
+
+    def get_json_info(self):
+        """Parsing data-boat attribute"""
+        data_boat = xpaths.DATA_BOAT(self.tree)
+        if not data_boat:
+            raise DataNotFound("span js-wishlist-toggle... not found")
+        return data_boat[0]
+
+    def extract(self, json_info, realtime):
+        """Collecting all information about boat"""
+        country, city = json_info['location'].split(', ')[:2]
+        boat = Boat(
+            url=self.url,
+            title=self.get_title(),
+            parsingdate=datetime.now().strftime('%H:%M %d/%m/%y'),
+            realtime=realtime,
+            location=Location(country=country, city=city),
+            year=self.get_year(),
+            length=json_info['length'].replace(' ', ''),
+            guests=self.get_guests(json_info),
+            type=self.rex_text(xpaths.RE_TYPE),
+            engine=self.get_engine(),
+            sleeps=self.get_sleeps(),
+            cabins=self.get_cabins(json_info),
+        )
+
+        bathrooms = self.find_boatview__stats('Bathrooms')
+        if bathrooms is not None:
+            boat.bathrooms = int(bathrooms)
+        else:
+            logging.debug("Bathrooms for 'bathrooms' not found in: %s",
+                          self.url)
+
+        about = self.get_about()
+        if about is None:
+            logging.debug("About for 'about' not found in: %s", self.url)
+        boat.about = about if about is not None else ''
+        boat.photos = self.get_images_urls()
+        boat.inventory = self.get_inventory()
+        boat.pickup = self.get_pickup()
+
+        equipment = self.get_equipment()
+        if len(equipment) < 1:
+            logging.debug("equipment not found in: %s", self.url)
+        else:
+            boat.equipment = equipment
+
+        boat.prices, boat.optional = self.get_prices()
+        return boat
+
+    def get_prices(self):
+        """Parsing information about Obligatory extras and Optional extras
+        for objects are prices and optional. Both lists are found for one
+        pass over headers of sections"""
+        lists = OrderedDict([
+            ('Obligatory extras', None),
+            ('Optional extras', None),
+        ])
+        for header in xpaths.EXTRAS_HEADERS(self.tree):
+            title = node_text(header)
+            for subject in lists:
+                if lists[subject] is None and subject in title:
+                    lists[subject] = xpaths.EXTRAS_LIST(header)
+                    break
+
+        return tuple(
+            self._parse_prices(subject, ul[0] if ul else None)
+            for subject, ul in lists.items()
+        )
+
+    def _parse_prices(self, subject, ul):
+        """Parsing list of prices from section of extras"""
+        if ul is None:
+            logging.debug("Price %s is not found on %s", subject, self.url)
+            return None
+
+        prices = []
+        for li in xpaths.PRICE_ITEMS(ul):
+            money = self._first_text(xpaths.PRICE_MONEY(li))
+            price = Price(
+                name=self._first_text(xpaths.PRICE_NAME(li)),
+                value=money[1:].replace(',', ''),
+                currency=money[0]
+            )
+
+            # Find perweek or perday
+            if xpaths.PRICE_PERWEEK(li):
+                price.perweek = True
+            elif xpaths.PRICE_PERDAY(li):
+                price.perday = True
+            prices.append(price)
+
+        if len(prices) < 1:
+            logging.debug("Price %s contains less than one element on: %s",
+                          subject, self.url)
+            return None
+
+        return prices
+
+    def get_equipment(self):
+        """Parsing equipment"""
+        equipment = OrderedDict()
+        if not xpaths.EQUIPMENT_HEADER(self.tree):
+            return equipment
+
+        titles = xpaths.EQUIPMENT_TITLES(self.tree)
+        if titles:
+            values = [
+                node_text(value)
+                for value in xpaths.EQUIPMENT_VALUES(self.tree)
+            ]
+            for item in titles:
+                equipment[node_text(item)] = list(values)
+
+        return equipment
+
+    def get_pickup(self):
+        """Parsing pickup"""
+        elements = self._first_text(xpaths.CARD_PICKUP(self.tree))
+
+        checkin, checkout = elements.replace(
+            "Check-in: ", ""
+        ).split(
+            ' Check-out: '
+        )
+
+        return Pickup(
+            checkin_datetime=checkin.split(", ")[0],
+            checkin_location=checkin.split(", ")[1],
+            checkout_datetime=checkout.split(", ")[0],
+            checkout_location=checkout.split(", ")[1]
+        )
+
+    def get_inventory(self):
+        """Parsing inventory"""
+        ul = xpaths.INVENTORY(self.tree)
+
+        if ul:
+            return [node_text(value) for value in xpaths.LIST_ITEMS(ul[0])]
+        else:
+            logging.debug("boatview__equipment-list for 'inventory'"
+                          " not found in: %s", self.url)
+            return None
+
+    def get_images_urls(self, parse_first_image=True):
+        """Parsing urls of images for photos"""
+        images = []
+        if parse_first_image:
+            first_image = xpaths.FIRST_IMAGE(self.tree)
+            if first_image and 'http' in first_image[0]:
+                images.append(str(first_image[0]))
+
+        images.extend(str(src) for src in xpaths.LAZY_IMAGES(self.tree))
+        if len(images) < 1:
+            logging.debug("Images not found in: %s", self.url)
+
+        return images
+
+    def get_about(self):
+        """Parsing article for about"""
+        about = self._first_text(xpaths.CARD_DESCRIPTION(self.tree))
+        if about is not None:
+            return about
+        else:
+            about = self._first_text(xpaths.CARD_PARAGRAPH(self.tree))
+            if about is None or len(about) < 90:
+                return None
+        return about
+
+    def get_cabins(self, json_info):
+        """Parsing cabins"""
+        cabins = json_info.get('cabins')
+        if cabins is not None:
+            return int(cabins)
+        cabins = self.find_boatview__stats("Cabins")
+        if cabins is not None:
+            return int(cabins)
+        else:
+            cabins = self.find_boatview__stats("Double cabins")
+            if cabins is not None:
+                return int(cabins)
+            else:
+                logging.debug("Cabins not found in: %s", self.url)
+                return None
+
+    def get_sleeps(self):
+        """Parsing sleeps"""
+        return self.find_boatview__stats('Sleeps')
+
+    def get_engine(self):
+        """Parsing for engine object"""
+        engine_value = self.find_boatview__stats('Sail type')
+        if engine_value is not None:
+            return engine_value
+        else:
+            logging.debug("Sail type for 'engine' not found in: %s", self.url)
+            engine_value = self.find_boatview__stats('Engine')
+            if engine_value is not None:
+                return engine_value
+            else:
+                logging.debug("Engine for 'engine' not found in: %s", self.url)
+
+    def get_guests(self, json_info):
+        """Parsing for guests object"""
+        guests = json_info.get('guests')
+        if guests is not None:
+            return int(guests)
+        guests = self.find_boatview__stats("Max. guests")
+        if guests is not None:
+            return int(guests)
+        else:
+            logging.debug("Guests not found in: %s", self.url)
+            return None
+
+    def get_stats(self):
+        """
+        Read all pairs (label, value) of boatview__stats for one pass.
+        Labels without value are skipped.
+        """
+        if self._stats is None:
+            self._stats = []
+            for label in xpaths.STATS_LABELS(self.tree):
+                values = xpaths.STATS_VALUES(label)
+                if values:
+                    self._stats.append((label.text or '',
+                                        node_text(values[0])))
+        return self._stats
+
+    def find_boatview__stats(self, pattern):
+        """Find elements in class: boatview__stats-label
+        and inside contains determined text"""
+        for label, value in self.get_stats():
+            if pattern in label:
+                return value
+        return None
+
+    def get_year(self):
+        """Parsing boat year old"""
+        year = xpaths.YEAR(self.tree)
+        if not year:
+            raise DataNotFound("releaseDate not found")
+        return int(year[0])
+
+    def get_title(self):
+        """Parsing title"""
+        title = self._first_text(xpaths.TITLE(self.tree))
+        if title is None:
+            raise DataNotFound("title not found")
+        return title
+
+    @staticmethod
+    def _first_text(nodes):
+        """Normalized text of first node or None"""
+        if nodes:
+            return node_text(nodes[0])
+        return None
+
+
+def extract_item(page):
+    """
+    Extract information about boat from BoatPage.
+    Returns tuple (boat, errors): boat is None if page isn't complete,
+    errors is list of keys: 'boatBanner', 'json', 'data-boat'.
+    """
+    errors = []
+    realtime_found = None
+    try:
+        realtime_found = page.get_realtime()
+    except DataNotFound:
+        errors.append('boatBanner')
+
+    json_info = {}
+    try:
+        json_info = json.loads(page.get_json_info())
+    except json.decoder.JSONDecodeError:
+        errors.append('json')
+    except IndexError:
+        errors.append('data-boat')
+
+    if len(json_info) < 1 or realtime_found is None:
+        return None, errors
+
+    realtime = True if realtime_found == 'realtime' else False
+    return page.extract(json_info, realtime), errors
+
+
+def extract_html(url, body, charset='utf-8'):
+    """Parse raw body of page and extract information about boat.
+    Is used by worker processes, see extraction.pool"""
+    tree = fromstring(body, parser=HTMLParser(encoding=charset))
+    page = BoatPage(tree, url, body.decode(charset, 'ignore'))
+    return extract_item(page)
@@ -0,0 +1,80 @@
+from datetime import datetime
+from urllib.parse import (parse_qsl, urlencode, urljoin, urlsplit,
+                          urlunsplit)
+
+from extraction import xpaths
+from extraction.models import Card, Price
+
+
+def page_url(url, num):
+    """Url of listing page with number num: ?page={NUM}"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query)
+             if key != 'page']
+    query.append(('page', str(num)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def card_text(card, xpath):
+    """Normalized text of first element of card or None"""
+    nodes = xpath(card)
+    if not nodes:
+        return None
+    return xpaths.RE_SPACE.sub(' ', nodes[0].text_content()).strip() or None
+
+
+class ListingPage(object):
+    """Extracting links and cards of boats from page with list of boats"""
+
+    def __init__(self, tree, url):
+        self.tree = tree
+        self.url = url
+
+    def get_item_urls(self):
+        """Urls of pages of boats"""
+        return [str(href) for href in xpaths.BOAT_LINKS(self.tree)]
+
+    def get_cards(self):
+        """Summaries of boats from their cards (catalog mode)"""
+        parsingdate = datetime.now().strftime('%H:%M %d/%m/%y')
+        cards = []
+        for node in xpaths.CARDS(self.tree):
+            href = xpaths.CARD_LINK(node)
+            if not href:
+                continue
+            cards.append(Card(
+                url=urljoin(self.url, str(href[0])),
+                title=card_text(node, xpaths.CARD_TITLE) or '',
+                parsingdate=parsingdate,
+                price=self._card_price(card_text(node, xpaths.CARD_PRICE)),
+                location=card_text(node, xpaths.CARD_LOCATION)
+            ))
+        return cards
+
+    def _card_price(self, text):
+        """Price of card from text like "from €1,250 per week" or None"""
+        match = xpaths.RE_CARD_PRICE.search(text or '')
+        if match is None:
+            return None
+        price = Price(value=match.group(2).replace(',', ''),
+                      currency=match.group(1))
+        if 'week' in text:
+            price.perweek = True
+        elif 'day' in text:
+            price.perday = True
+        return price
+
+    def get_next_url(self):
+        """Url (maybe relative) of next page or None"""
+        href = xpaths.NEXT_PAGE(self.tree)
+        return str(href[0]) if href else None
+
+    def get_page_count(self):
+        """Max number of page in pagination links or None"""
+        numbers = [
+            int(match.group(1))
+            for match in map(xpaths.RE_PAGE_NUM.search,
+                             xpaths.PAGINATION(self.tree))
+            if match is not None
+        ]
+        return max(numbers) if numbers else None
@@ -0,0 +1,186 @@
+"""
+Typed records of extracted boats.
+
+Records have __slots__, so they are compact while items wait for saving
+or are passed from worker processes. Boat.to_dict is the only serializer:
+it validates types of fields and returns OrderedDict with the same keys
+and order as results have always been saved with. Card is summary of boat
+from listing page (catalog mode).
+"""
+from collections import OrderedDict
+
+
+class Record(object):
+    __slots__ = ()
+
+    # Tuples (attribute, key in result, types, always present)
+    FIELDS = ()
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError("Unknown fields of %s: %s"
+                            % (type(self).__name__, ', '.join(kwargs)))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+        )
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__
+        ))
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def validate(self):
+        """Raise ValueError if some field has wrong type"""
+        errors = []
+        for name, _, types, required in self.FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                if required and type(None) not in types:
+                    errors.append('%s is missing' % name)
+            elif not isinstance(value, types) \
+                    or isinstance(value, bool) and bool not in types:
+                errors.append('%s has type %s' % (name, type(value).__name__))
+            elif isinstance(value, list):
+                errors.extend(
+                    '%s[%d] has type %s' % (name, index, type(item).__name__)
+                    for index, item in enumerate(value)
+                    if not isinstance(item, (str, Price))
+                )
+            if isinstance(value, Record):
+                value.validate()
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Record):
+                        item.validate()
+        if errors:
+            raise ValueError("Invalid %s: %s"
+                             % (type(self).__name__, '; '.join(errors)))
+
+    def to_dict(self, validate=True):
+        """Fields as OrderedDict, None values of optional fields are
+        omitted"""
+        if validate:
+            self.validate()
+        result = OrderedDict()
+        for name, key, _, required in self.FIELDS:
+            value = getattr(self, name)
+            if value is None and not required:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict(validate=False)
+            elif isinstance(value, list):
+                value = [item.to_dict(validate=False)
+                         if isinstance(item, Record) else item
+                         for item in value]
+            result[key] = value
+        return result
+
+
+class Location(Record):
+    __slots__ = ('country', 'city')
+    FIELDS = (
+        ('country', 'country', (str,), True),
+        ('city', 'city', (str,), True),
+    )
+
+
+class Pickup(Record):
+    __slots__ = ('checkin_datetime', 'checkin_location',
+                 'checkout_datetime', 'checkout_location')
+    FIELDS = (
+        ('checkin_datetime', 'datetime', (str,), True),
+        ('checkin_location', 'location', (str,), True),
+        ('checkout_datetime', 'datetime', (str,), True),
+        ('checkout_location', 'location', (str,), True),
+    )
+
+    def to_dict(self, validate=True):
+        if validate:
+            self.validate()
+        return OrderedDict([
+            ('checkin', OrderedDict([
+                ('datetime', self.checkin_datetime),
+                ('location', self.checkin_location),
+            ])),
+            ('checkout', OrderedDict([
+                ('datetime', self.checkout_datetime),
+                ('location', self.checkout_location),
+            ])),
+        ])
+
+
+class Price(Record):
+    __slots__ = ('name', 'value', 'perweek', 'perday', 'currency')
+    FIELDS = (
+        ('name', 'name', (str, type(None)), True),
+        ('value', 'value', (str,), True),
+        ('perweek', 'perweek', (bool,), False),
+        ('perday', 'perday', (bool,), False),
+        ('currency', 'currency', (str,), True),
+    )
+
+
+class Boat(Record):
+    __slots__ = ('url', 'title', 'parsingdate', 'realtime', 'location',
+                 'year', 'length', 'guests', 'type', 'engine', 'sleeps',
+                 'cabins', 'bathrooms', 'about', 'photos', 'inventory',
+                 'pickup', 'equipment', 'prices', 'optional')
+    FIELDS = (
+        ('url', 'url', (str,), True),
+        ('title', 'title', (str,), True),
+        ('parsingdate', 'parsingdate', (str,), True),
+        ('realtime', 'realtimeavilbility', (bool,), True),
+        ('location', 'location', (Location,), True),
+        ('year', 'year', (int, type(None)), True),
+        ('length', 'length', (str,), True),
+        ('guests', 'guests', (int,), False),
+        ('type', 'type', (str,), True),
+        ('engine', 'engine', (str,), False),
+        ('sleeps', 'sleeps', (str,), False),
+        ('cabins', 'cabins', (int,), False),
+        ('bathrooms', 'bathrooms', (int,), False),
+        ('about', 'about', (str,), True),
+        ('photos', 'photos', (list,), True),
+        ('inventory', 'inventory', (list,), False),
+        ('pickup', 'pickup', (Pickup,), True),
+        ('equipment', 'equipment', (dict,), False),
+        ('prices', 'prices', (list,), False),
+        ('optional', 'optional', (list,), False),
+    )
+
+    def __len__(self):
+        """Number of fields which are saved"""
+        return sum(1 for name, _, _, required in self.FIELDS
+                   if required or getattr(self, name) is not None)
+
+    def to_dict(self, validate=True):
+        result = super(Boat, self).to_dict(validate=validate)
+        # Obligatory extras are saved inside of "prices"
+        if 'prices' in result:
+            result['prices'] = OrderedDict([
+                ('obligatory', result['prices']),
+            ])
+        return result
+
+
+class Card(Record):
+    __slots__ = ('url', 'title', 'parsingdate', 'price', 'location')
+    FIELDS = (
+        ('url', 'url', (str,), True),
+        ('title', 'title', (str,), True),
+        ('parsingdate', 'parsingdate', (str,), True),
+        ('price', 'price', (Price,), False),
+        ('location', 'location', (str,), False),
+    )
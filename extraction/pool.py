@@ -0,0 +1,147 @@
+"""
+Pool of processes for extraction of items.
+
+Raw bodies of pages are passed to worker processes, so CPU-heavy parsing
+doesn't compete for GIL with network threads of spider.
+
+Workers are started by forkserver (or spawn) instead of fork: spider has
+running threads (writer, logging, network) at that moment and forked
+child could inherit their held locks. Records which are logged in
+workers are passed to root logger of spider through queue.
+
+When worker process dies (killed by OOM killer, crash of lxml) executor
+is broken: it's replaced by new one and pages which were in it are parsed
+in spider process.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+import threading
+
+from extraction.boat_page import extract_html
+
+
+def get_context():
+    """Context of multiprocessing which doesn't fork spider process"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def init_worker(log_queue, level):
+    """Logging of worker process: records are put into log_queue"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+class RootHandler(logging.Handler):
+    """Pass records from workers to handlers of root logger"""
+
+    def emit(self, record):
+        logging.getLogger().handle(record)
+
+
+class ParsePool(object):
+    """
+    Submit pages to worker processes. Function callback(context, result)
+    is called in thread of pool with result of extract_item.
+    No more than 2 * workers pages are processed at once, submit blocks
+    till one of them is done.
+    """
+
+    def __init__(self, workers, callback):
+        self._context = get_context()
+        self._workers = workers
+        self._log_queue = self._context.Queue()
+        self._log_listener = QueueListener(self._log_queue, RootHandler())
+        self._log_listener.start()
+        self._executor = self._make_executor()
+        self._callback = callback
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _make_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=self._context,
+            initializer=init_worker,
+            initargs=(self._log_queue,
+                      logging.getLogger().getEffectiveLevel())
+        )
+
+    def _restart(self, broken):
+        """Replace broken executor (once for all threads which found it)"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            logging.error("Worker of parse pool has died, pool is restarted")
+            self._executor = self._make_executor()
+        broken.shutdown(wait=False)
+
+    def submit(self, context, url, body, charset):
+        self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._submit(url, body, charset)
+        except BrokenProcessPool:
+            # New executor is broken too
+            self._parse(context, url, body, charset)
+            return
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(
+            lambda future: self._done(context, url, body, charset, future)
+        )
+
+    def _submit(self, url, body, charset):
+        executor = self._executor
+        try:
+            return executor.submit(extract_html, url, body, charset)
+        except BrokenProcessPool:
+            self._restart(executor)
+            return self._executor.submit(extract_html, url, body, charset)
+
+    def _done(self, context, url, body, charset, future):
+        if not future.cancelled() \
+                and isinstance(future.exception(), BrokenProcessPool):
+            logging.warning("Worker has died while parsing %s, it's parsed "
+                            "in spider process", url)
+            self._parse(context, url, body, charset)
+            return
+        try:
+            self._callback(context, future.result())
+        except Exception:
+            logging.exception("Item hasn't been parsed: %s", url)
+        finally:
+            self._release()
+
+    def _parse(self, context, url, body, charset):
+        """Parse page in this process (without workers)"""
+        try:
+            self._callback(context, extract_html(url, body, charset))
+        except Exception:
+            logging.exception("Item hasn't been parsed: %s", url)
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def is_idle(self):
+        with self._lock:
+            return self._pending == 0
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._log_listener.stop()
+        self._log_queue.close()
@@ -0,0 +1,72 @@
+"""
+Compiled XPath expressions and regular expressions for boat pages.
+
+Every expression is compiled once at import and is reused for each page.
+"""
+import re
+
+from lxml.etree import XPath
+
+
+TITLE = XPath('//h1[@class="h2 copy-sp-s"]')
+YEAR = XPath('//time[@itemprop="releaseDate"]/@datetime')
+DATA_BOAT = XPath(
+    '//span[@class="wishlist-btn js-wishlist-toggle boatview__wishlist"]'
+    '/@data-boat'
+)
+
+# All labels of stats with their values, reads for one pass
+STATS_LABELS = XPath('//span[contains(@class, "boatview__stats-label")]')
+STATS_VALUES = XPath('../span[@class="boatview__stats-value"]')
+
+CARD_BODY = '//div[@class="card__body card__body--l"]'
+CARD_DESCRIPTION = XPath(CARD_BODY + '//div[@class="boatview__description"]')
+CARD_PARAGRAPH = XPath(CARD_BODY + '//p')
+CARD_PICKUP = XPath(CARD_BODY + '/p[@class="p--s copy-sp-m"]')
+
+FIRST_IMAGE = XPath('//figure[@class="item"]/img[@class="img-fluid"]/@src')
+LAZY_IMAGES = XPath(
+    '//figure[@class="item"]/img[@class="lazyOwl img-fluid"]/@data-src'
+)
+
+INVENTORY = XPath('//ul[@class="boatview__equipment-list"]')
+LIST_ITEMS = XPath('li[@class="list__item"]')
+
+EQUIPMENT_HEADER = XPath('//h2[@id="equipment"]')
+EQUIPMENT_TITLES = XPath(
+    '//div[@class="grid__unit"]/div[@class="h6 copy-sp-m"]'
+)
+EQUIPMENT_VALUES = XPath(
+    '//ul[@class="list-bulleted"]/li[@class="list__item"]'
+)
+
+EXTRAS_HEADERS = XPath('//h3[@class="h6 copy-sp-m"]')
+EXTRAS_LIST = XPath('following::ul[1]')
+PRICE_ITEMS = XPath('.//li[@class="list__item u-cf"]')
+PRICE_NAME = XPath('node()')
+PRICE_MONEY = XPath('node()/strong')
+PRICE_PERWEEK = XPath(
+    'span[@class="boatview__extras-amount" and contains(text(),"per week")]'
+)
+PRICE_PERDAY = XPath(
+    'span[@class="boatview__extras-amount" and contains(text(),"per day")]'
+)
+
+RE_BOAT_BANNER = re.compile(r"'boatBanner'\s*:\s*'(.*?)',")
+RE_TYPE = re.compile(r"'type': '(.+?)',")
+RE_SPACE = re.compile(r'\s+', re.U)
+
+# Listing pages
+BOAT_LINKS = XPath('//a[@class="boat__figure"]/@href')
+NEXT_PAGE = XPath('//a[@title="Next"]/@href')
+PAGINATION = XPath('//a[contains(@href, "page=")]/@href')
+RE_PAGE_NUM = re.compile(r'[?&]page=(\d+)')
+
+# Cards of boats on listing pages (catalog mode)
+CARDS = XPath('//a[@class="boat__figure"]/..')
+CARD_LINK = XPath('a[@class="boat__figure"]/@href')
+CARD_TITLE = XPath('.//*[contains(@class, "boat__title")]')
+CARD_PRICE = XPath('.//*[contains(@class, "boat__price")]')
+CARD_LOCATION = XPath('.//*[contains(@class, "boat__location")]')
+# Currency and value of price: "from €1,250 per week"
+RE_CARD_PRICE = re.compile(r'([^\d\s.,])\s*(\d[\d,]*(?:\.\d+)?)')
@@ -0,0 +1,118 @@
+"""
+Logging with low overhead for hot paths of spider.
+
+Records are put into queue by QueueHandler, and they are formatted and
+written into file by QueueListener in own thread, so threads of spider
+don't wait for I/O. Arguments of record are merged into message only by
+listener (call sites pass them separately: logging.debug("... %s", url)),
+so they mustn't be changed after call.
+
+Repetitive messages (from one line of code) with level below WARNING can
+be sampled (only every sample-th is passed) and limited by rate (no more
+than rate records per second). Number of dropped records is added to
+next passed record from the same line.
+"""
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+import time
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler which doesn't format records in thread of caller.
+    When queue is full records are dropped"""
+
+    def __init__(self, log_queue):
+        super(DeferredQueueHandler, self).__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Frames of traceback can be changed till listener formats it
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Sampling and limit of rate of records from one line of code"""
+
+    def __init__(self, sample=1, rate=0, level=logging.WARNING):
+        super(SamplingFilter, self).__init__()
+        self.sample = max(sample, 1)
+        self.rate = rate
+        self.level = level
+        # (file, line) -> [number of records, tokens, time, dropped]
+        self._lines = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._lines.get(key)
+            if state is None:
+                state = self._lines[key] = [0, self.rate, now, 0]
+            state[0] += 1
+            passed = (state[0] - 1) % self.sample == 0
+            if passed and self.rate:
+                state[1] = min(self.rate,
+                               state[1] + (now - state[2]) * self.rate)
+                state[2] = now
+                if state[1] >= 1:
+                    state[1] -= 1
+                else:
+                    passed = False
+            if not passed:
+                state[3] += 1
+                return False
+            dropped, state[3] = state[3], 0
+        if dropped:
+            record.msg = '%s [%d similar messages dropped]' % (record.msg,
+                                                              dropped)
+        return True
+
+
+def setup_logging(level, filename=None, fmt=None, use_queue=True,
+                  sample=1, rate=0, queue_size=100000):
+    """
+    Configure root logger. Records are written into filename (or stderr).
+    Returns started QueueListener (it must be stopped at the end for
+    writing of rest of records) or None if queue isn't used.
+    """
+    if filename:
+        handler = logging.FileHandler(filename, encoding='utf-8')
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+
+    # Format doesn't contain names of threads and processes
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    sampling = SamplingFilter(sample=sample, rate=rate)
+    if not use_queue:
+        handler.addFilter(sampling)
+        root.addHandler(handler)
+        return None
+
+    queue_handler = DeferredQueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(sampling)
+    root.addHandler(queue_handler)
+    listener = QueueListener(queue_handler.queue, handler)
+    listener.start()
+    return listener
@@ -0,0 +1,298 @@
+"""
+Metrics of crawling in format of Prometheus.
+
+Registry keeps counters, gauges and histograms with labels. Duration of
+stages (download, task_page, task_item, save_result) is measured by
+Registry.time, time of every helper of extraction by instrument.
+Metrics are exposed by MetricsServer on http://host:port/metrics
+(and /metrics.json) and are saved by SnapshotWriter into json-file.
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Upper bounds of buckets of histograms in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(key):
+    if not key:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in key
+    )
+
+
+class Metric(object):
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels):
+        # Values of labels are strings (codes of responses are 200 and
+        # 'error', keys must be sortable)
+        return tuple(sorted((name, str(value))
+                            for name, value in labels.items()))
+
+    def render(self):
+        """Lines of metric in text format of Prometheus"""
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s %s' % (self.name, self.kind)]
+        for name, key, value in self.samples():
+            lines.append('%s%s %s' % (name, format_labels(key), value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+    def snapshot(self):
+        return [{'labels': dict(key), 'value': value}
+                for _, key, value in self.samples()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        super(Histogram, self).__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                # Counts of buckets (last one is +Inf), sum and count
+                item = self._values[key] = [[0] * (len(self.buckets) + 1),
+                                            0.0, 0]
+            item[0][bisect_left(self.buckets, value)] += 1
+            item[1] += value
+            item[2] += 1
+
+    def _items(self):
+        with self._lock:
+            return sorted((key, (list(item[0]), item[1], item[2]))
+                          for key, item in self._values.items())
+
+    def samples(self):
+        for key, (counts, total, count) in self._items():
+            cumulative = 0
+            for bound, amount in zip(self.buckets + ('+Inf',), counts):
+                cumulative += amount
+                yield ('%s_bucket' % self.name,
+                       key + (('le', bound),), cumulative)
+            yield '%s_sum' % self.name, key, round(total, 6)
+            yield '%s_count' % self.name, key, count
+
+    def snapshot(self):
+        return [{
+            'labels': dict(key),
+            'count': count,
+            'sum': round(total, 6),
+            'buckets': OrderedDict(
+                (str(bound), amount)
+                for bound, amount in zip(self.buckets + ('+Inf',), counts)
+            ),
+        } for key, (counts, total, count) in self._items()]
+
+
+class Registry(object):
+    """Set of metrics of spider. Names of metrics have prefix"""
+
+    def __init__(self, prefix='parser'):
+        self.prefix = prefix
+        self.started = time.time()
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+        self.stage_seconds = self.histogram(
+            'stage_seconds', "Duration of stages of crawling")
+        self.stage_inflight = self.gauge(
+            'stage_inflight', "Number of stages which are running now")
+        self.field_seconds = self.histogram(
+            'extract_field_seconds', "Duration of helpers of extraction")
+
+    def _get(self, cls, name, help_text, **kwargs):
+        name = '%s_%s' % (self.prefix, name)
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help_text, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    @contextmanager
+    def time(self, stage, **labels):
+        """Measure duration of stage and number of running stages"""
+        self.stage_inflight.inc(stage=stage)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started,
+                                       stage=stage, **labels)
+            self.stage_inflight.dec(stage=stage)
+
+    def render(self):
+        """All metrics in text format of Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append('# TYPE %s_uptime_seconds gauge' % self.prefix)
+        lines.append('%s_uptime_seconds %.3f'
+                     % (self.prefix, time.time() - self.started))
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """All metrics as dict for json"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return OrderedDict([
+            ('time', time.time()),
+            ('uptime', round(time.time() - self.started, 3)),
+            ('metrics', OrderedDict(
+                (metric.name, {'type': metric.kind,
+                               'values': metric.snapshot()})
+                for metric in metrics
+            )),
+        ])
+
+
+def timed(method, histogram, **labels):
+    """Wrapper of function which measures its duration"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+    return wrapper
+
+
+def instrument(obj, histogram, methods, label='field'):
+    """Replace methods of object with wrappers which measure their
+    duration. Wrappers are set as attributes of instance, so calls
+    from other methods of object are measured too"""
+    for name in methods:
+        setattr(obj, name,
+                timed(getattr(obj, name), histogram, **{label: name}))
+    return obj
+
+
+class MetricsServer(object):
+    """HTTP server of metrics in own thread"""
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = registry.render().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(registry.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("Metrics server: " + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics-server', daemon=True)
+        self._thread.start()
+        logging.info("Metrics are available on http://%s:%d/metrics",
+                     *self._server.server_address[:2])
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class SnapshotWriter(object):
+    """Save snapshot of metrics into json-file every interval seconds"""
+
+    def __init__(self, registry, filename, interval=60):
+        self.registry = registry
+        self.filename = filename
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='metrics-snapshot', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def save(self):
+        temp = self.filename + '.tmp'
+        try:
+            with open(temp, 'w', encoding='utf-8') as file:
+                json.dump(self.registry.snapshot(), file, indent=2)
+            os.replace(temp, self.filename)
+        except OSError:
+            logging.exception("Snapshot of metrics hasn't been saved")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.save()
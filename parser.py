@@ -1,25 +1,50 @@
 #!/usr/bin/env python
 
 import sys
-from collections import OrderedDict
 from datetime import datetime
-import json
 import logging
 from os import path, makedirs
-import re
+import time
 
 from grab.spider import Spider, Task
-from lxml.html import fromstring
-from selection import XpathSelector
-from weblib.error import DataNotFound
+from grab.spider.cache_pipeline import CachePipeline
 
 from config.config_parser import ConfigReader
+from config.watcher import ConfigWatcher
+from engine.coordinator import Coordinator
+from engine.frontier import BloomFilter, Frontier
+from engine.photo_pipeline import PhotoPipeline
+from engine.proxy_scheduler import ProxyScheduler
+from engine.retry_policy import RetryPolicy
+from extraction.boat_page import BoatPage, extract_item
+from extraction.listing_page import ListingPage, page_url
+from monitoring.logs import setup_logging
+from monitoring.metrics import (MetricsServer, Registry, SnapshotWriter,
+                                instrument)
+from storage.catalog import Catalog
+from storage.crawl_state import CrawlState, data_hash
+from storage.photo_store import PhotoStore
+from storage.response_cache import CacheBackend
+from storage.result_index import ResultIndex
+from storage.task_queue import QueueBackend
+from storage.sinks import BackgroundWriter, make_sink
 
 
 # Set absolute path of working directory
 ROOT_DIR = path.dirname(path.abspath(__file__))
 LOG_FORMAT = "'%(filename)s[LINE:%(lineno)d]#%(levelname)-8s [%(asctime)s] \
 %(message)s'"
+# Marker in results of parser: task has been processed completely
+TASK_DONE = object()
+# Integer values of debug constants
+LEVELS_DEBUG = {
+    'CRITICAL': 50,
+    'ERROR': 40,
+    'WARNING': 30,
+    'INFO': 20,
+    'DEBUG': 10,
+    'NOTSET': 0
+}
 
 
 class MySpider(Spider):
@@ -28,471 +53,899 @@ class MySpider(Spider):
 
     def __init__(self, *args, **kwargs):
         self._ext_config = kwargs.pop('ext_config')
-        super(self, *args, **kwargs).__init__(*args, **kwargs)
+        self.async_engine = None
+        self.proxy_scheduler = None
+        self._proxy_updated = 0
+        self.metrics = Registry()
+        self.metrics_server = None
+        self.metrics_snapshot = None
+        super(MySpider, self).__init__(*args, **kwargs)
 
     def prepare(self):
         """Must be done before begin parsing"""
-        self.parsed_urls = []
         if self._ext_config['initialurl']:
             self.initial_urls = [self._ext_config['initialurl']]
+        # Initial tasks are yielded by task_generator with cache timeout
+        self._initial_urls = self.initial_urls
+        self.initial_urls = []
+
+        sink = make_sink(self._ext_config)
+        self.type_file = sink.type_file
+        self.writer = BackgroundWriter(
+            sink,
+            batch_size=self._ext_config.get('batchsize') or 100,
+            flush_interval=self._ext_config.get('flushinterval') or 5,
+            metrics=self.metrics,
+            on_saved=self.item_saved
+        )
+
+        self.catalog = None
+        if self._ext_config.get('catalog'):
+            self.catalog = Catalog(
+                make_sink(self._ext_config, catalog=True),
+                batch_size=self._ext_config.get('batchsize') or 100,
+                flush_interval=self._ext_config.get('flushinterval') or 5,
+                metrics=self.metrics
+            )
+
+        snapshot = self._ext_config.get('indexfile')
+        self.result_index = ResultIndex(
+            self._ext_config['dirresults'],
+            sink.scan_ids,
+            snapshot=self.results_path(snapshot) if snapshot else None,
+            modified=sink.modified
+        ).load()
+
+        self.crawl_state = None
+        if self._ext_config.get('incremental'):
+            self.crawl_state = CrawlState(
+                self.results_path(
+                    self._ext_config.get('statefile') or 'state.sqlite'
+                ),
+                max_age=(self._ext_config.get('maxage') or 0) * 3600
+            )
+
+        dead_letter = self._ext_config.get('deadletterfile')
+        self.retry_policy = RetryPolicy(
+            max_tries=self._ext_config.get('parsetrylimit') or 5,
+            # Zero delay is allowed (repeat at once)
+            delay=self._ext_config.get('retrydelay', 10),
+            max_delay=self._ext_config.get('retrymaxdelay', 600),
+            dead_letter=(self.results_path(dead_letter) if dead_letter
+                         else None),
+            metrics=self.metrics
+        )
+
+        self.response_cache = None
+        if self._ext_config.get('usecache'):
+            self.setup_local_cache()
+
+        if self._ext_config.get('durablequeue'):
+            self.task_queue = QueueBackend(
+                self.get_spider_name(),
+                database=self.results_path(
+                    self._ext_config.get('queuefile') or 'queue.sqlite'
+                )
+            )
+
+        self.photos = None
+        if self._ext_config.get('downloadphotos'):
+            self.photos = PhotoPipeline(
+                PhotoStore(
+                    self.results_path(
+                        self._ext_config.get('photosdir') or 'photos'
+                    ),
+                    self._ext_config['dirresults']
+                ),
+                self.save_result,
+                concurrency=self._ext_config.get('photoconcurrency') or 4,
+                bandwidth=(self._ext_config.get('photobandwidth') or 0) * 1024,
+                metrics=self.metrics
+            )
+
+        # Items which have been queued (instead of list of urls)
+        self._started = time.time()
+        self.frontier = Frontier(
+            BloomFilter(
+                capacity=self._ext_config.get('seencapacity') or 1000000,
+                error_rate=self._ext_config.get('seenerrorrate') or 0.001
+            ),
+            confirm=self.parsed_in_run,
+            max_queued=self._ext_config.get('maxqueueditems') or 0,
+            metrics=self.metrics
+        )
+
+        self.coordinator = None
+        if self._ext_config.get('coordinatorfile'):
+            self.coordinator = Coordinator(
+                self.results_path(self._ext_config['coordinatorfile']),
+                self._ext_config.get('worker') or 0,
+                lease=self._ext_config.get('workerlease') or 300
+            )
+
+        self.parse_pool = None
+        if self._ext_config.get('parseprocesses'):
+            from extraction.pool import ParsePool
+            self.parse_pool = ParsePool(self._ext_config['parseprocesses'],
+                                        self.item_parsed)
+
+        self.setup_metrics()
+
+    def setup_metrics(self):
+        """Start http-server of metrics and saving of their snapshots"""
+        if self._ext_config.get('metricsport'):
+            try:
+                self.metrics_server = MetricsServer(
+                    self.metrics, self._ext_config['metricsport'],
+                    host=self._ext_config.get('metricshost') or '127.0.0.1'
+                )
+            except OSError:
+                logging.exception("Server of metrics hasn't been started")
+        if self._ext_config.get('metricsfile'):
+            self.metrics_snapshot = SnapshotWriter(
+                self.metrics,
+                self.results_path(self._ext_config['metricsfile']),
+                interval=self._ext_config.get('metricsinterval') or 60
+            )
+
+    @property
+    def metrics_enabled(self):
+        """Metrics are exported by http-server or snapshots"""
+        return self.metrics_server is not None \
+            or self.metrics_snapshot is not None
+
+    def setup_local_cache(self):
+        """Setup local cache of responses. In replay mode pages are
+        loaded only from cache and all cached items are parsed again"""
+        self.response_cache = CacheBackend(
+            self.results_path(
+                self._ext_config.get('cachefile') or 'cache.sqlite'
+            ),
+            spider=self,
+            max_size=(self._ext_config.get('cachemaxsize') or 0) * 1024 * 1024
+        )
+        # Asyncio engine reads and saves cache itself
+        if self.async_engine is None:
+            self.cache_pipeline = CachePipeline(self, self.response_cache)
+        if self._ext_config.get('replay'):
+            self.only_cache = True
+
+    def results_path(self, filename):
+        """Full path for file if it's relative to directory of results"""
+        if '/' not in filename and '\\' not in filename:
+            return path.join(self._ext_config['dirresults'], filename)
+        return filename
+
+    def cache_timeout(self, name):
+        """Max age in seconds of cached response for task with name"""
+        if self.response_cache is None or self._ext_config.get('replay'):
+            return None
+        if name == 'item':
+            return self._ext_config.get('cachettlitem') or None
+        return self._ext_config.get('cachettlpage') or None
+
+    def task_generator(self):
+        """Initial tasks or, in replay mode, tasks for all cached items"""
+        if self._ext_config.get('replay') and self.response_cache is not None:
+            for url in self.response_cache.urls('item'):
+                yield Task('item', url=url, page=None)
+            return
+
+        if isinstance(self.task_queue, QueueBackend) \
+                and self.task_queue.resumed:
+            logging.info("Crawling is resumed from durable queue")
+            return
+
+        for url in self._initial_urls:
+            yield Task('initial', url=url,
+                       cache_timeout=self.cache_timeout('page'))
+
+    def shutdown(self):
+        """Must be done after parsing"""
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+        if self.photos is not None:
+            self.photos.flush()
+        self.writer.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        self.result_index.close()
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.metrics_snapshot is not None:
+            self.metrics_snapshot.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.coordinator is not None:
+            self.coordinator.close()
 
     def get_id(self, url):
         """Get unique slug page"""
         return url.split('/')[-1]
 
-    def save_result(self, file_id, data):
-        """Save received data into json-format"""
-        filename = path.join(
-            self._ext_config['dirresults'],
-            "{0}.{1}".format(file_id, self.type_file)
-        )
-        with open(filename, 'w') as file:
-            file.write(data)
-        logging.info("File %s has beed saved!" % filename)
+    def save_result(self, file_id, data, task=None):
+        """Pass received data (dict or Boat) to the writer of sink.
+        Task of item is done when item is written"""
+        if task is not None:
+            self.defer_done(task, 'writer')
+        self.writer.write(file_id, data, task)
+        logging.debug("Item %s has been queued for saving", file_id)
+
+    def item_saved(self, file_id, task):
+        """Item has been written by sink (is called from thread of writer).
+        Id isn't in index and task isn't done till then, so item which
+        hasn't been written is parsed again on next start"""
+        self.result_index.add(file_id)
+        if task is not None:
+            self.frontier.finished(self.get_id(task.url))
+            self.task_done(task)
+        else:
+            self.frontier.finished(file_id)
+
+    def item_finished(self, task):
+        """Task of item is finished without saving. Its id is in flight
+        while repeat of it is waiting in queue"""
+        if not self.retry_policy.is_waiting(task.url):
+            self.frontier.finished(self.get_id(task.url))
 
     def file_exist(self, file_id):
-        """Check on file exists with that name"""
-        filename = path.join(
-            self._ext_config['dirresults'],
-            "{0}.{1}".format(file_id, self.type_file)
-        )
-        if path.exists(filename):
+        """Check on file exists with that name (looks up in the index)"""
+        return file_id in self.result_index
+
+    def parsed_in_run(self, file_id):
+        """Exact check of item which frontier has (probably) seen and which
+        isn't in flight: it has been saved (or checked in incremental mode)
+        after start. It's checked by state and results on disk, not by ids
+        in memory. With rewrite_files saved items are parsed again, so time
+        of saving is checked (sinks which don't know it say "not parsed")"""
+        if self.crawl_state is not None:
+            state = self.crawl_state.get(file_id)
+            return state is not None and (state[3] or 0) >= self._started
+        if not self.file_exist(file_id):
+            return False
+        if self._ext_config['rewrite_files']:
+            saved = self.writer.sink.item_modified(file_id)
+            return saved is not None and saved >= self._started
+        return True
+
+    def need_parse(self, file_id, task=None):
+        """Item must be parsed if it's new, files are rewritten, its card
+        in catalog has been changed or in incremental mode it hasn't been
+        checked for maxage hours"""
+        if not self.file_exist(file_id) or self._ext_config['rewrite_files'] \
+                or self._ext_config.get('replay') \
+                or task is not None and task.get('card_changed'):
             return True
-        else:
+        if self.crawl_state is not None:
+            return not self.crawl_state.is_fresh(file_id)
+        return False
+
+    def item_task(self, url, page, card_changed=False):
+        """Task for item. In incremental mode request is conditional
+        and it's not loaded from cache"""
+        if self.crawl_state is not None:
+            headers = self.crawl_state.conditional_headers(self.get_id(url))
+            if headers:
+                grab = self.create_grab_instance(url=url, headers=headers)
+                return Task('item', grab=grab, page=page, disable_cache=True,
+                            card_changed=card_changed)
+        return Task('item', url, page=page, card_changed=card_changed,
+                    cache_timeout=self.cache_timeout('item'))
+
+    def own_items(self, urls):
+        """Ids of items which are parsed by this worker (all ids
+        without coordinator)"""
+        ids = [self.get_id(url) for url in urls]
+        if self.coordinator is None:
+            return set(ids)
+        owned = self.coordinator.claim_items(ids)
+        if len(owned) < len(ids):
+            logging.debug("%d items are parsed by other workers",
+                          len(ids) - len(owned))
+        return owned
+
+    def update_catalog(self, listing, owned):
+        """Save new and changed cards of listing page into catalog.
+        Returns None if items are parsed as usual or set of ids of items
+        which are parsed (catalogItems: changed - new and changed cards,
+        none - only cards are saved)"""
+        if self.catalog is None:
+            return None
+        changed = set()
+        for card in listing.get_cards():
+            file_id = self.get_id(card.url)
+            if file_id in owned and self.catalog.update(file_id, card):
+                changed.add(file_id)
+        mode = self._ext_config.get('catalogitems') or 'changed'
+        if mode == 'all':
+            return None
+        return changed if mode == 'changed' else set()
+
+    def hold_page(self, page_task):
+        """Hold task of next listing page while too many items are
+        waiting in queue (backpressure). Returns True if it's held"""
+        if not self.frontier.is_full():
             return False
+        self.frontier.hold(page_task)
+        return True
+
+    def page_task(self, base, num, total=None):
+        """Task for listing page with number num (parallel discovery).
+        Url of first page and total of pages are kept in task: they are
+        needed for next pages when task is resumed from durable queue"""
+        return Task('page', url=page_url(base, num), page_num=num,
+                    page_base=base, page_total=total,
+                    cache_timeout=self.cache_timeout('page'))
+
+    def discover_pages(self, grab, listing):
+        """Tasks for first pages after initial in parallel discovery.
+        No more than discoverywindow listing pages are queued at once,
+        every parsed page queues page with number larger by window
+        (or next page claimed from coordinator)"""
+        base = grab.doc.url
+        total = listing.get_page_count()
+        window = self._ext_config.get('discoverywindow') or 10
+        if self.coordinator is not None:
+            if total is not None:
+                self.coordinator.set_total(total)
+                logging.info("Found %d listing pages", total)
+            for _ in range(window):
+                num = self.coordinator.claim_page()
+                if num is None:
+                    break
+                yield self.page_task(base, num, total)
+            return
+        last = 1 + window
+        if total is not None:
+            last = min(last, total)
+            logging.info("Found %d listing pages", total)
+        for num in range(2, last + 1):
+            yield self.page_task(base, num, total)
+
+    def next_page_task(self, task, empty=False):
+        """Task for next listing page in parallel discovery or None.
+        When total of pages is unknown pages are probed till empty page"""
+        total = task.get('page_total')
+        if self.coordinator is not None:
+            self.coordinator.page_done(task.page_num, empty=empty)
+            return self.claimed_page_task(task)
+
+        num = task.page_num + (self._ext_config.get('discoverywindow') or 10)
+        if total is not None:
+            if num > total:
+                return None
+        elif empty:
+            logging.debug("Page %d is empty, probing is stopped",
+                          task.page_num)
+            return None
+        return self.page_task(task.page_base, num, total)
+
+    def claimed_page_task(self, task):
+        """Task for listing page claimed from coordinator or None"""
+        num = self.coordinator.claim_page()
+        if num is None:
+            return None
+        return self.page_task(task.page_base, num, task.get('page_total'))
 
     def task_initial(self, grab, task):
         """Begining parsing"""
-        for elem in grab.doc.select('//a[@class="boat__figure"]'):
-            yield Task('item', elem.attr('href'), page=grab.doc.url)
+        with self.metrics.time('task_initial'):
+            listing = ListingPage(grab.doc.tree, grab.doc.url)
+            listing.get_item_urls()
+        owned = self.own_items(listing.get_item_urls())
+        changed = self.update_catalog(listing, owned)
+        for url in listing.get_item_urls():
+            file_id = self.get_id(url)
+            if file_id not in owned:
+                continue
+            if changed is None or file_id in changed:
+                if self.frontier.add(file_id):
+                    yield self.item_task(url, grab.doc.url,
+                                         card_changed=changed is not None)
+
+        # Workers of coordinator don't follow the same chain of "Next"
+        if self._ext_config.get('discovery') == 'parallel' \
+                or self.coordinator is not None:
+            for page_task in self.discover_pages(grab, listing):
+                yield page_task
+            return
 
-        url_page_next = grab.doc.select('//a[@title="Next"]')
-        if url_page_next.exists():
+        url_page_next = listing.get_next_url()
+        if url_page_next is not None:
             yield Task(
                 'page',
-                url=grab.make_url_absolute(url_page_next.attr('href'))
+                url=grab.make_url_absolute(url_page_next),
+                cache_timeout=self.cache_timeout('page')
             )
         else:
-            logging.debug("Next page doesn't exist. Current url %s: "
-                          % grab.doc.url)
+            logging.debug("Next page doesn't exist. Current url %s: ",
+                          grab.doc.url)
 
     def task_page(self, grab, task):
         """Parsing pages. https://www.zizoo.com/en/b/?page={NUM}"""
-        logging.debug("Parsing current page: %s" % grab.doc.url)
-        for elem in grab.doc.select('//a[@class="boat__figure"]'):
-            if not self.file_exist(self.get_id(elem.attr('href'))) \
-                    or config['rewrite_files']:
-                yield Task('item', elem.attr('href'), page=grab.doc.url)
-            else:
-                logging.info("Item will not parse since file exists: %s.%s"
-                             % (self.get_id(elem.attr('href')), self.type_file)
-                             )
+        logging.debug("Parsing current page: %s", grab.doc.url)
+        with self.metrics.time('task_page'):
+            listing = ListingPage(grab.doc.tree, grab.doc.url)
+            listing.get_item_urls()
+        owned = self.own_items(listing.get_item_urls())
+        changed = self.update_catalog(listing, owned)
+        for url in listing.get_item_urls():
+            file_id = self.get_id(url)
+            if file_id not in owned:
+                continue
+            if changed is not None:
+                if file_id not in changed:
+                    continue
+            elif not self.need_parse(file_id):
+                logging.info("Item will not parse since file exists: %s.%s",
+                             file_id, self.type_file)
+                continue
+            if self.frontier.add(file_id):
+                yield self.item_task(url, grab.doc.url,
+                                     card_changed=changed is not None)
+
+        if task.get('page_num') is not None:
+            page_task = self.next_page_task(
+                task, empty=not listing.get_item_urls()
+            )
+            if page_task is not None and not self.hold_page(page_task):
+                yield page_task
+            return
 
         # Search next link
-        url_page_next = grab.doc.select('//a[@title="Next"]')
-        if url_page_next.exists():
+        url_page_next = listing.get_next_url()
+        if url_page_next is not None:
             # If next link exists then task add
-            yield Task(
+            page_task = Task(
                 'page',
-                url=grab.make_url_absolute(url_page_next.attr('href'))
+                url=grab.make_url_absolute(url_page_next),
+                cache_timeout=self.cache_timeout('page')
             )
+            if not self.hold_page(page_task):
+                yield page_task
         else:
-            logging.debug("Next page doesn't exist. Current url: %s"
-                          % grab.doc.url)
+            logging.debug("Next page doesn't exist. Current url: %s",
+                          grab.doc.url)
 
     def task_item(self, grab, task):
         """Parsing information about boat"""
-        if self.file_exist(self.get_id(grab.doc.url)) \
-                and not config['rewrite_files']:
-            logging.info("Item will not parse since file exists: %s.%s page:%s"
-                         % (self.get_id(grab.doc.url),
-                            self.type_file,
-                            task.page)
-                         )
-            return
-
-        logging.debug("Begining item parsing: %s" % grab.doc.url)
-        json_info = {}
-        realtime_found = None
-        try:
-            realtime_found = grab.doc.rex_text("'boatBanner'\s*:\s*'(.*?)',")
-        except DataNotFound:
-            logging.warning(
-                "Repeat... 'boatBanner' for realtimeavibility not found in: %s"
-                % grab.doc.url
-            )
-            # Repeat task
-            yield Task('item', url=grab.config['url'],
-                       task_try_count=task.task_try_count + 1)
-
-        data_boat = grab.doc.select('//span[@class="wishlist-btn ' +
-                                    'js-wishlist-toggle boatview__wishlist"]')
+        for page_task in self.frontier.started(self.get_id(task.url)):
+            yield page_task
         try:
-            json_info = json.loads(data_boat.attr('data-boat'))
-        except json.decoder.JSONDecodeError:
-            logging.warning("Json decode error for data-boat in: %s"
-                            % grab.doc.url)
-            # Repeat task
-            yield Task('item', url=grab.config['url'],
-                       task_try_count=task.task_try_count + 1)
-        except IndexError:
-            logging.warning("span js-wishlist-toggle... not found in: %s"
-                            % grab.doc.url)
-            # Repeat task
-            yield Task('item', url=grab.config['url'],
-                       task_try_count=task.task_try_count + 1)
-
-        if len(json_info) < 1 or realtime_found is None:
+            for new_task in self.parse_item(grab, task):
+                yield new_task
+        finally:
+            # Item which is passed to pool or writer is finished by them
+            if not task.get('done_by'):
+                self.item_finished(task)
+
+    def parse_item(self, grab, task):
+        """Parse page of item or pass it to pool of parsing processes"""
+        if self.response_cache is not None and not task.get('disable_cache') \
+                and not getattr(grab.doc, 'from_cache', False):
+            # Response is stored by cache pipeline: replay finds all cached
+            # items by kind (skipped ones too)
+            self.response_cache.set_kind(task.url, 'item')
+
+        if self.crawl_state is not None and grab.doc.code == 304:
+            logging.info("Item has not been modified: %s", grab.doc.url)
+            self.crawl_state.update(self.get_id(grab.doc.url))
             return
 
-        realtime = True if realtime_found == 'realtime' else False
-        info = OrderedDict()
-        info['url'] = grab.doc.url
-        info['title'] = self.get_title(grab)
-        info['parsingdate'] = datetime.now().strftime('%H:%M %d/%m/%y')
-        info['realtimeavilbility'] = realtime
-
-        location = json_info['location']
-        info['location'] = OrderedDict([
-            ('country', location.split(', ')[0]),
-            ('city', location.split(', ')[1])
-        ])
-
-        data = OrderedDict(info)
-
-        data['year'] = self.get_year(grab)
-        data['length'] = json_info['length'].replace(' ', '')
+        self.retry_policy.started(task.url)
+        if grab.doc.code == 404:
+            self.retry_policy.fail(task, 'HTTP 404', permanent=True)
+            return
 
-        guests = self.get_guests(grab, json_info)
-        if guests is not None:
-            data['guests'] = int(guests)
-        data['type'] = grab.doc.rex_text("'type': '(.+?)',")
+        if not self.need_parse(self.get_id(grab.doc.url), task):
+            logging.info("Item will not parse since file exists: %s.%s "
+                         "page:%s", self.get_id(grab.doc.url), self.type_file,
+                         task.get('page'))
+            return
 
-        engine_value = self.get_engine(grab)
-        if engine_value is not None:
-            data['engine'] = engine_value
+        logging.debug("Begining item parsing: %s", grab.doc.url)
+        if self.parse_pool is not None:
+            headers = dict((name, grab.doc.headers.get(name))
+                           for name in ('ETag', 'Last-Modified'))
+            # Task is done when result of pool is processed
+            self.defer_done(task, 'pool')
+            self.parse_pool.submit((task, headers, time.perf_counter()),
+                                   grab.doc.url, grab.doc.body,
+                                   grab.doc.charset)
+            return
 
-        sleeps = self.get_sleeps(grab)
-        if sleeps is not None:
-            data['sleeps'] = sleeps
+        with self.metrics.time('task_item'):
+            page = BoatPage(grab.doc.tree, grab.doc.url,
+                            grab.doc.unicode_body())
+            if self.metrics_enabled:
+                # Wrappers of helpers are too costly when nobody reads them
+                instrument(page, self.metrics.field_seconds, BoatPage.HELPERS)
+            result = extract_item(page)
+        for new_task in self.process_item(task, grab.doc.url,
+                                          grab.doc.headers, result):
+            yield new_task
+
+    def item_parsed(self, context, result):
+        """Callback of pool of parsing processes"""
+        task, headers, started = context
+        # Time of parsing includes waiting in pool
+        self.metrics.stage_seconds.observe(time.perf_counter() - started,
+                                           stage='task_item')
+        for new_task in self.process_item(task, task.url, headers, result):
+            self.add_task(new_task)
+        # Task of item which is passed to writer is done by writer
+        if task.get('done_by') == 'pool':
+            self.item_finished(task)
+            self.task_done(task)
+
+    def process_item(self, task, url, headers, result):
+        """Save extracted boat or repeat task by retry policy"""
+        boat, errors = result
+        messages = {
+            'boatBanner': "Repeat... 'boatBanner' for realtimeavibility "
+                          "not found in: %s",
+            'json': "Json decode error for data-boat in: %s",
+            'data-boat': "span js-wishlist-toggle... not found in: %s",
+        }
+        for error in errors:
+            logging.warning(messages[error], url)
+
+        if boat is None:
+            # Page without banner and data of boat is usually page of
+            # anti-bot protection, captcha or maintenance: it's repeated
+            retry = self.retry_policy.retry(task, ', '.join(errors))
+            if retry is not None:
+                yield retry
+            return
 
-        cabins = self.get_cabins(grab, json_info)
-        if cabins is not None:
-            data['cabins'] = cabins
+        try:
+            boat.validate()
+        except ValueError as ex:
+            self.retry_policy.fail(task, str(ex), permanent=True)
+            return
 
-        bathrooms = self.find_boatview__stats(grab, 'Bathrooms')
-        if bathrooms is not None:
-            data['bathrooms'] = int(bathrooms)
-        else:
-            logging.debug("Bathrooms for 'bathrooms' not found in: %s"
-                          % grab.doc.url)
-
-        about = self.get_about(grab)
-        if about is None:
-            logging.debug("About for 'about' not found in: %s"
-                          % grab.doc.url)
-        data['about'] = about if about is not None else ''
-        data['photos'] = self.get_images_urls(grab)
-
-        inventory = self.get_inventory(grab)
-        if inventory is not None:
-            data['inventory'] = inventory
-
-        data['pickup'] = self.get_pickup(grab)
-
-        equipment = self.get_equipment(grab)
-        if len(equipment) < 1:
-            logging.debug("equipment not found in: %s"
-                          % grab.doc.url)
-        else:
-            data['equipment'] = equipment
-
-        prices = self.get_prices(grab, 'Obligatory extras')
-        optional = self.get_prices(grab, 'Optional extras')
-        if prices is not None:
-            data['prices'] = OrderedDict([
-                ('obligatory', prices),
-            ])
-        if optional is not None:
-            data['optional'] = optional
-
-        if self.file_exist(self.get_id(grab.doc.url)) \
-                and not config['rewrite_files']:
-            logging.info("Item will not save since file exists: %s.%s"
-                         % (self.get_id(grab.doc.url), self.type_file)
-                         )
+        file_id = self.get_id(url)
+        if not self.need_parse(file_id, task):
+            logging.info("Item will not save since file exists: %s.%s",
+                         file_id, self.type_file)
             return
 
-        # If elements more than 10 then save results into json-format
-        if len(data) > 9:
-            logging.debug("Saving url: %s from page: %s"
-                          % (grab.doc.url, task.page))
-            self.save_result(
-                self.get_id(grab.doc.url),
-                json.dumps(data, ensure_ascii=False, indent=2)
+        if self.crawl_state is not None:
+            digest = data_hash(boat.to_dict(validate=False))
+            state = self.crawl_state.get(file_id)
+            self.crawl_state.update(
+                file_id,
+                etag=headers.get('ETag'),
+                last_modified=headers.get('Last-Modified'),
+                digest=digest
             )
+            if state is not None and state[2] == digest \
+                    and self.file_exist(file_id):
+                logging.info("Item has not been changed: %s", url)
+                return
+
+        # If elements more than 10 then save results
+        if len(boat) > 9:
+            logging.debug("Saving url: %s from page: %s", url,
+                          task.get('page'))
+            if self.photos is not None:
+                if file_id in self.photos:
+                    # Item is saved by task which has been parsed earlier
+                    return
+                # Item is saved when its photos are downloaded
+                self.defer_done(task, 'writer')
+                for photo_task in self.photos.add(file_id, boat, task):
+                    yield photo_task
+            else:
+                self.save_result(file_id, boat, task)
         else:
-            logging.info(
-                "Data hasn't been saved. It contains less 10 objects: %s.%s"
-                % (self.get_id(grab.doc.url), self.type_file)
-            )
-            # Repeat task
-            yield Task('item', url=grab.config['url'],
-                       task_try_count=task.task_try_count + 1)
-
-    def get_prices(self, grab, subject):
-        """Parsing information about Obligatory extras and Optional extras
-        for objects are prices and optional"""
-        prices = []
-        try:
-            extras = grab.doc.rex_text(
-                '<h3 class\="h6 copy-sp-m">.*?%s.*?</h3>(.+?)</ul>' % subject,
-                flags=re.S
-            )
-        except DataNotFound:
-            logging.debug(
-                "Price %s is not found on %s"
-                % (subject, grab.doc.url)
-            )
-            return None
-
-        sel = XpathSelector(fromstring(extras))
-        prices = []
-        for li in sel.select('//li[@class="list__item u-cf"]'):
-            obligatory = OrderedDict()
-            obligatory['name'] = li.select('node()').text()
-            money = li.select('node()/strong').text()
-            obligatory['value'] = money[1:].replace(',', '')
-
-            # Find perweek or perday
-            if li.select(
-                'span[@class="boatview__extras-amount"' +
-                ' and contains(text(),"per week")]'
-            ).exists():
-                obligatory['perweek'] = True
-            elif li.select(
-                'span[@class="boatview__extras-amount"' +
-                ' and contains(text(),"per day")]'
-            ).exists():
-                obligatory['perday'] = True
-            obligatory['currency'] = money[0]
-            prices.append(obligatory)
-
-        if len(prices) < 1:
-            logging.debug(
-                "Price %s contains less than one element on: %s"
-                % (subject, grab.doc.url)
-            )
-            return None
-
-        return prices
-
-    def get_equipment(self, grab):
-        """Parsing equipment"""
-        equipment = OrderedDict()
-        grid = grab.doc.select(
-            '//h2[@id="equipment"]'
-        )
-        for item in grid.select(
-            '//div[@class="grid__unit"]'
-        ).select(
-                'div[@class="h6 copy-sp-m"]'):
-            ul = item.select('//ul[@class="list-bulleted"]')
-            equipment[item.text()] = [
-                value.text() for value in ul.select('li[@class="list__item"]')
-            ]
-
-        return equipment
-
-    def get_pickup(self, grab):
-        """Parsing pickup"""
-        pickup = OrderedDict()
-
-        elements = self.find_in_card__body(
-            grab,
-            '/p[@class="p--s copy-sp-m"]',
-        )
-
-        checkin, checkout = elements.replace(
-            "Check-in: ", ""
-        ).split(
-            ' Check-out: '
-        )
-
-        pickup['checkin'] = OrderedDict([
-            ('datetime', checkin.split(", ")[0]),
-            ('location', checkin.split(", ")[1])
-        ])
-
-        pickup['checkout'] = OrderedDict([
-            ('datetime', checkout.split(", ")[0]),
-            ('location', checkout.split(", ")[1])
-        ])
-
-        return pickup
-
-    def get_inventory(self, grab):
-        """Parsing inventory"""
-        ul = grab.doc.select('//ul[@class="boatview__equipment-list"]')
-
-        if ul.exists():
-            return [
-                value.text()
-                for value in ul[0].select('li[@class="list__item"]')
-            ]
+            logging.info("Data hasn't been saved. It contains less 10 "
+                         "objects: %s.%s", file_id, self.type_file)
+            retry = self.retry_policy.retry(task, 'incomplete data')
+            if retry is not None:
+                yield retry
+
+    def task_photo(self, grab, task):
+        """Save downloaded photo of boat"""
+        body = grab.doc.body if grab.doc.code == 200 else None
+        for photo_task in self.photos.done(
+                task, body, grab.doc.headers.get('Content-Type')):
+            yield photo_task
+
+    def task_photo_fallback(self, task):
+        """Photo hasn't been downloaded after all tries"""
+        for photo_task in self.photos.done(task):
+            self.add_task(photo_task)
+
+    def task_page_fallback(self, task):
+        """Listing page hasn't been downloaded after all tries. In parallel
+        discovery next pages aren't lost with it: the page is returned to
+        coordinator or the next page of its chain is queued"""
+        if task.get('page_num') is None:
+            logging.error("Listing page %s hasn't been downloaded, next "
+                          "pages aren't found", task.url)
+            return
+        if self.coordinator is not None:
+            if self.coordinator.release_page(task.page_num):
+                logging.warning("Listing page %s hasn't been downloaded, "
+                                "it's returned to coordinator", task.url)
+            else:
+                logging.error("Listing page %s hasn't been downloaded",
+                              task.url)
+            page_task = self.claimed_page_task(task)
         else:
-            logging.debug("boatview__equipment-list for 'inventory'" +
-                          " not found in: %s" % grab.doc.url)
-            return None
+            logging.error("Listing page %s hasn't been downloaded", task.url)
+            page_task = self.next_page_task(task)
+        if page_task is not None and not self.hold_page(page_task):
+            self.add_task(page_task)
+
+    def task_item_fallback(self, task):
+        """Item hasn't been downloaded after all tries: its url is written
+        into dead-letter file"""
+        self.retry_policy.started(task.url)
+        if task.network_try_count > self.network_try_limit:
+            reason = 'network errors'
+        else:
+            reason = 'tries are exhausted'
+        self.retry_policy.fail(task, reason)
+        self.frontier.finished(self.get_id(task.url))
+        for page_task in self.frontier.started(self.get_id(task.url)):
+            self.add_task(page_task)
+
+    def has_pending_items(self):
+        """Some items are parsed by pool yet or listing pages are held
+        by frontier (they are queued when queue is empty)"""
+        if self.frontier.held:
+            for page_task in self.frontier.release(force=True):
+                self.add_task(page_task)
+            return True
+        return self.parse_pool is not None and not self.parse_pool.is_idle()
 
-    def get_images_urls(self, grab, parse_first_image=True):
-        """Parsing urls of images for photos"""
-        images = []
-        if parse_first_image:
-            first_image = grab.doc.select(
-                '//figure[@class="item"]' +
-                '/img[@class="img-fluid"]'
-            )
-            if first_image.exists() and 'http' in first_image.attr('src'):
-                images.append(first_image.attr('src'))
-
-        for image in grab.doc.select(
-                '//figure[@class="item"]' +
-                '/img[@class="lazyOwl img-fluid"]'):
-            images.append(image.attr('data-src'))
-        if len(images) < 1:
-            logging.debug("Images not found in: %s" % grab.doc.url)
-
-        return images
-
-    def get_about(self, grab):
-        """Parsing article for about"""
-        about = self.find_in_card__body(
-            grab,
-            '//div[@class="boatview__description"]'
-        )
-        if about is not None:
-            return about
+    def is_ready_to_shutdown(self):
+        """Spider waits for items which are parsed by pool"""
+        if self.has_pending_items():
+            return False
+        return super(MySpider, self).is_ready_to_shutdown()
+
+    def defer_done(self, task, owner):
+        """Task isn't marked as done after its handler, task_done is
+        called later by owner: 'pool' (when item is parsed) or 'writer'
+        (when item is saved)"""
+        task.done_by = owner
+
+    def task_done(self, task):
+        """Remove processed task from durable queue. Task which is done
+        isn't repeated after crash"""
+        if isinstance(self.task_queue, QueueBackend):
+            self.task_queue.task_done(task)
+
+    def process_network_result(self, result, handler):
+        """After results of handler the task is marked as done"""
+        super(MySpider, self).process_network_result(result, handler)
+        if isinstance(self.task_queue, QueueBackend) \
+                and not result['task'].get('done_by'):
+            self.parser_result_queue.put((TASK_DONE, result['task']))
+
+    def process_handler_result(self, result, task):
+        """Remove processed task from durable queue"""
+        if result is TASK_DONE:
+            self.task_done(task)
         else:
-            about = self.find_in_card__body(grab, '//p')
-            if about is None or len(about) < 90:
-                return None
-        return about
+            super(MySpider, self).process_handler_result(result, task)
+
+    def check_task_limits(self, task):
+        """Rejected task is removed from durable queue"""
+        is_valid, reason = super(MySpider, self).check_task_limits(task)
+        if not is_valid:
+            self.task_done(task)
+        return is_valid, reason
+
+    def setup_proxies(self):
+        """Load list of proxies determined in config"""
+        source = self._ext_config['listproxies']
+        if source.startswith('http://') or source.startswith('https://'):
+            source_type = 'url'
+        else:
+            source_type = 'text_file'
 
-    def find_in_card__body(self, grab, pattern, normalize_space=True):
-        """Search elements in class: card__body card__body--l"""
-        value = grab.doc.select(
-            '//div[@class="card__body card__body--l"]' +
-            pattern
+        self.load_proxylist(
+            source,
+            source_type=source_type,
+            proxy_type=self._ext_config['typeproxy'],
+            auto_change=True
         )
 
-        if value.exists():
-            return value.text(normalize_space=normalize_space)
-        else:
-            return None
-
-    def get_cabins(self, grab, json_info):
-        """Parsing cabins"""
-        cabins = json_info.get('cabins')
-        if cabins is not None:
-            return int(cabins)
-        cabins = self.find_boatview__stats(grab, "Cabins")
-        if cabins is not None:
-            return int(cabins)
-        else:
-            cabins = self.find_boatview__stats(grab, "Double cabins")
-            if cabins is not None:
-                return int(cabins)
+    def apply_config(self, changes):
+        """Apply options of settings.ini which have been changed on
+        running crawl (is called from thread of config.watcher)"""
+        self._ext_config.update(changes)
+        config = self._ext_config
+        if 'numthreads' in changes or 'hostconcurrency' in changes:
+            if self.async_engine is not None:
+                self.async_engine.set_limits(
+                    concurrency=config['numthreads'],
+                    per_host=config.get('hostconcurrency')
+                    or config['numthreads']
+                )
+            elif config['numthreads'] > self.thread_number:
+                logging.warning("numThreads is more than maxThreads, "
+                                "only %d threads are used",
+                                self.thread_number)
+        if 'network_try_limit' in changes:
+            self.network_try_limit = config['network_try_limit']
+        if 'parsetrylimit' in changes:
+            self.task_try_limit = config['parsetrylimit']
+            self.retry_policy.max_tries = config['parsetrylimit']
+        if 'maxqueueditems' in changes:
+            self.frontier.max_queued = config['maxqueueditems']
+        if 'retrydelay' in changes:
+            self.retry_policy.delay = config['retrydelay']
+        if 'retrymaxdelay' in changes:
+            self.retry_policy.max_delay = config['retrymaxdelay']
+        if self.photos is not None:
+            if 'photoconcurrency' in changes:
+                self.photos.concurrency = config['photoconcurrency']
+            if 'photobandwidth' in changes:
+                self.photos.bandwidth = config['photobandwidth'] * 1024
+        if self.metrics_snapshot is not None and 'metricsinterval' in changes:
+            self.metrics_snapshot.interval = config['metricsinterval']
+        if 'level' in changes:
+            logging.getLogger().setLevel(LEVELS_DEBUG[config['level']])
+
+        proxy_options = ('useproxy', 'typeproxy', 'listproxies',
+                         'proxyscheduler')
+        if any(key in changes for key in proxy_options):
+            if config['useproxy']:
+                self.setup_proxies()
             else:
-                logging.debug("Cabins not found in: %s" % grab.doc.url)
-                return None
+                self.proxylist = None
+                self.proxylist_enabled = False
+                self.proxy = None
+                self.proxy_scheduler = None
+        if self.proxy_scheduler is not None:
+            if 'proxyconcurrency' in changes:
+                self.proxy_scheduler.max_concurrency = \
+                    config['proxyconcurrency']
+            if 'proxybackoff' in changes:
+                self.proxy_scheduler.backoff = config['proxybackoff']
+
+    def load_proxylist(self, *args, **kwargs):
+        """Load proxies and pass them to scheduler if it's enabled"""
+        super(MySpider, self).load_proxylist(*args, **kwargs)
+        self._proxy_updated = time.time()
+        if self._ext_config.get('proxyscheduler'):
+            self.proxy_scheduler = ProxyScheduler(
+                max_concurrency=self._ext_config.get('proxyconcurrency') or 8,
+                backoff=self._ext_config.get('proxybackoff') or 30
+            )
+            self.proxy_scheduler.update(self.proxylist)
 
-    def get_sleeps(self, grab):
-        """Parsing sleeps"""
-        sleeps = self.find_boatview__stats(grab, 'Sleeps')
-        if sleeps is not None:
-            return sleeps
-
-    def get_engine(self, grab):
-        """Parsing for engine object"""
-        engine_value = self.find_boatview__stats(grab, 'Sail type')
-        if engine_value is not None:
-            return engine_value
+    def update_proxylist(self):
+        """Reload list of proxies from its source"""
+        self._proxy_updated = time.time()
+        try:
+            self.proxylist.load()
+        except Exception:
+            logging.exception("List of proxies hasn't been updated")
+            return
+        logging.info("List of proxies has been updated: %d proxies",
+                     self.proxylist.size())
+        if self.proxy_scheduler is not None:
+            self.proxy_scheduler.update(self.proxylist)
+
+    def proxy_delay(self, task):
+        """Seconds till task can be sent through proxy of scheduler: 0 if
+        a proxy is free now (or scheduler isn't used)"""
+        if self.proxy_scheduler is None or not self.proxylist_enabled \
+                or not task.use_proxylist:
+            return 0
+        return self.proxy_scheduler.delay()
+
+    def postpone(self, task, delay):
+        """Return task into queue for delay seconds"""
+        task.process_delay_option(delay)
+        self.add_task(task)
+
+    def change_active_proxy(self, task, grab):
+        """Update list every periodproxyupdate seconds and choose proxy
+        by scheduler (or random proxy without it). Task is taken from
+        queue only when scheduler has free proxy (see proxy_delay)"""
+        period = self._ext_config.get('periodproxyupdate')
+        if period and time.time() - self._proxy_updated >= period:
+            self.update_proxylist()
+        if self.proxy_scheduler is None:
+            super(MySpider, self).change_active_proxy(task, grab)
         else:
-            logging.debug("Sail type for 'engine' not found in: %s"
-                          % grab.doc.url)
-            engine_value = self.find_boatview__stats(grab, 'Engine')
-            if engine_value is not None:
-                return engine_value
-            else:
-                logging.debug("Engine for 'engine' not found in: %s"
-                              % grab.doc.url)
-
-    def get_guests(self, grab, json_info):
-        """Parsing for guests object"""
-        guests = json_info.get('guests')
-        if guests is not None:
-            return int(guests)
-        guests = self.find_boatview__stats(grab, "Max. guests")
-        if guests is not None:
-            return int(guests)
+            self.proxy = self.proxy_scheduler.acquire()
+
+    def log_network_result_stats(self, res, from_cache=False):
+        """Pass result of request to proxy scheduler"""
+        super(MySpider, self).log_network_result_stats(res,
+                                                       from_cache=from_cache)
+        if from_cache:
+            self.count_response('cache')
+        elif res['ok']:
+            self.metrics.stage_seconds.observe(res['grab'].doc.total_time,
+                                               stage='download')
+            self.count_response(res['grab'].doc.code)
         else:
-            logging.debug("Guests not found in: %s" % grab.doc.url)
-            return None
-
-    def find_boatview__stats(self, grab, pattern):
-        """Find elements in class: boatview__stats-label
-        and inside contains determined text"""
-        value = grab.doc.select(
-            '//span[contains(@class, "boatview__stats-label")' +
-            ' and contains(text(),"%s")]' % pattern +
-            '/../span[@class="boatview__stats-value"]'
-        )
+            self.count_response('error')
 
-        if value.exists():
-            return value.text()
+        if self.proxy_scheduler is None or not res['grab']:
+            return
+        address = res['grab'].config.get('proxy')
+        if not address:
+            return
+        if from_cache:
+            # Proxy has been acquired for the task but isn't used
+            self.proxy_scheduler.release(address)
+        elif res['ok']:
+            self.proxy_scheduler.report(address, True,
+                                        latency=res['grab'].doc.total_time,
+                                        code=res['grab'].doc.code)
         else:
-            return None
+            self.proxy_scheduler.report(address, False)
+
+    def count_response(self, code):
+        """Count response by code ('cache' or 'error' for network error)"""
+        self.metrics.counter(
+            'responses_total', "Responses by code"
+        ).inc(code=code)
+
+    def get_task_from_queue(self):
+        """Next task while less than numThreads requests are active.
+        Task is postponed while every proxy is paused or busy"""
+        if self.transport.get_active_threads_number() \
+                >= self._ext_config['numthreads']:
+            # True means waiting for tasks, handlers of transport are run
+            return True
+        task = super(MySpider, self).get_task_from_queue()
+        if isinstance(task, Task):
+            delay = self.proxy_delay(task)
+            if delay:
+                logging.debug("No free proxy, task %s is postponed for "
+                              "%.1f sec: %s", task.name, delay, task.url)
+                self.postpone(task, delay)
+                return True
+        return task
+
+    def add_task(self, task, raise_error=False):
+        """Add task into queue of grab or of asyncio engine"""
+        if self.async_engine is not None:
+            return self.async_engine.add_task(task)
+        return super(MySpider, self).add_task(task, raise_error=raise_error)
 
-    def get_year(self, grab):
-        """Parsing boat year old"""
-        return int(
-            grab.doc.select(
-                '//time[@itemprop="releaseDate"]'
-            ).attr('datetime')
-        )
 
-    def get_title(self, grab):
-        """Parsing title"""
-        return grab.doc.select('//h1[@class="h2 copy-sp-s"]').text()
+def worker_filename(filename, worker):
+    """Name of file of worker: queue.sqlite -> queue.w2.sqlite"""
+    root, extension = path.splitext(filename)
+    return '%s.w%d%s' % (root, worker, extension)
 
 
 if __name__ == '__main__':
     cls = globals()[sys.argv[1] if len(sys.argv) > 1 else 'MySpider']
 
-    # Integer values of debug constants
-    LEVELS_DEBUG = {
-        'CRITICAL': 50,
-        'ERROR': 40,
-        'WARNING': 30,
-        'INFO': 20,
-        'DEBUG': 10,
-        'NOTSET': 0
-    }
-
     # Load config from file and set determined type
     config_obj = ConfigReader(file_config='settings.ini')
-    config = config_obj.config_read(types_params={
-        'useproxy': 'bool',
-        'uselog': 'bool',
-        'logintofile': 'bool',
-        'numthreads': 'int',
-        'network_try_limit': 'int',
-        'periodproxyupdate': 'int',
-        'rewrite_files': 'bool'
-    })
+    config = config_obj.config_read()
+
+    # Number of worker can be passed after name of spider:
+    # python parser.py MySpider 2
+    if len(sys.argv) > 2:
+        config['worker'] = int(sys.argv[2])
+    if config.get('coordinatorfile'):
+        # Every worker has own queue, index, cache, logs and metrics
+        for key in ('queuefile', 'indexfile', 'cachefile', 'deadletterfile',
+                    'metricsfile', 'logfile'):
+            if config.get(key):
+                config[key] = worker_filename(config[key], config['worker'])
+        if config.get('metricsport'):
+            config['metricsport'] += config['worker']
 
     # Section for logging
+    log_listener = None
     if config['uselog']:
         prefix_date = "{0}-{1}-{2}_{3}-{4}".format(
             datetime.now().day,
@@ -517,10 +970,14 @@ if __name__ == '__main__':
         else:
             filename = None
 
-        logging.basicConfig(
-            level=logging.getLevelName(level),
+        # Records are written from own thread of queue listener
+        log_listener = setup_logging(
+            level,
             filename=filename,
-            format=LOG_FORMAT
+            fmt=LOG_FORMAT,
+            use_queue=config.get('logqueue', True),
+            sample=config.get('logsample') or 1,
+            rate=config.get('lograte') or 0
         )
 
     # If directory for results are saving not contains path's directory
@@ -531,35 +988,49 @@ if __name__ == '__main__':
     if not path.isdir(config['dirresults']):
         makedirs(config['dirresults'])
 
+    # Transport of grab has maxThreads streams, no more than numThreads
+    # of them are used at once (it can be changed on running crawl)
     bot = cls(
-        thread_number=config['numthreads'],
+        thread_number=max(config['numthreads'],
+                          config.get('maxthreads') or 0),
         network_try_limit=config['network_try_limit'],
+        task_try_limit=config['parsetrylimit'],
         ext_config=config
     )
 
-    # bot.setup_cache(database='zizoo_net')
-    # bot.setup_queue(backend='mongo', database='zizoo_tasks')
-
     # Section for determine list of proxies and type proxy
     if config['useproxy']:
-        if config['listproxies'].startswith('http://') \
-                or config['listproxies'].startswith('https://'):
-            source_type = 'url'
-        else:
-            source_type = 'text_file'
-
-        bot.load_proxylist(
-            config['listproxies'],
-            source_type=source_type,
-            proxy_type=config['typeproxy'],
-            auto_change=True
+        bot.setup_proxies()
+
+    # Asyncio engine runs handlers of spider on event loop
+    # (aiohttp is imported only for it)
+    if config.get('engine') == 'asyncio':
+        from engine.async_engine import AsyncEngine
+        runner = AsyncEngine(
+            bot,
+            concurrency=config['numthreads'],
+            per_host=config.get('hostconcurrency') or config['numthreads']
         )
+    else:
+        runner = bot
+
+    # Changes of settings.ini are applied to running crawl
+    watcher = None
+    if config.get('configreload'):
+        watcher = ConfigWatcher(config_obj, bot.apply_config,
+                                interval=config['configreload'])
 
     # Start parser
     try:
-        bot.run()
+        runner.run()
     except KeyboardInterrupt:
         pass
+    if watcher is not None:
+        watcher.close()
 
     # Show statistic work at the end
-    logging.info(bot.render_stats())
+    logging.info(runner.render_stats())
+    if bot.proxy_scheduler is not None:
+        logging.info(bot.proxy_scheduler.render_stats())
+    if log_listener is not None:
+        log_listener.stop()
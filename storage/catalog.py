@@ -0,0 +1,46 @@
+"""
+Catalog of boats: summaries from cards of listing pages.
+
+Hashes of saved cards are loaded from sink of catalog at start, so card is
+saved only when it's new or its title, price or location is changed.
+"""
+import logging
+import threading
+
+from storage.crawl_state import data_hash
+from storage.sinks import BackgroundWriter
+
+
+class Catalog(object):
+    def __init__(self, sink, batch_size=100, flush_interval=5, metrics=None):
+        self._hashes = dict(
+            (file_id, data_hash(data)) for file_id, data in sink.iter_items()
+        )
+        logging.info("Catalog has %d cards", len(self._hashes))
+        self._lock = threading.Lock()
+        self.metrics = metrics
+        self.writer = BackgroundWriter(sink, batch_size=batch_size,
+                                       flush_interval=flush_interval)
+
+    def __contains__(self, file_id):
+        return file_id in self._hashes
+
+    def update(self, file_id, card):
+        """Save card if it's new or changed. Returns True if it's saved"""
+        digest = data_hash(card.to_dict())
+        with self._lock:
+            previous = self._hashes.get(file_id)
+            if previous == digest:
+                return False
+            self._hashes[file_id] = digest
+        self.writer.write(file_id, card)
+        if self.metrics is not None:
+            self.metrics.counter(
+                'cards_total', "Cards which have been saved"
+            ).inc(kind='new' if previous is None else 'changed')
+        logging.debug("Card %s is %s", file_id,
+                      'new' if previous is None else 'changed')
+        return True
+
+    def close(self):
+        self.writer.close()
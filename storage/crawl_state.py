@@ -0,0 +1,88 @@
+"""
+State of pages for incremental crawling.
+
+For every id of page keeps ETag and Last-Modified headers of response,
+hash of extracted data and time of last check.
+"""
+from hashlib import sha1
+import json
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    hash TEXT,
+    checked REAL
+);
+"""
+
+
+def data_hash(data, exclude=('parsingdate',)):
+    """Hash of extracted data without fields which change on every parsing"""
+    value = dict((key, data[key]) for key in data if key not in exclude)
+    return sha1(
+        json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+class CrawlState(object):
+    """Storage of states of pages in SQLite"""
+
+    def __init__(self, filename, max_age=0):
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=60,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def get(self, file_id):
+        """Tuple (etag, last_modified, hash, checked) or None"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT etag, last_modified, hash, checked FROM pages '
+                'WHERE id = ?', (file_id,)
+            ).fetchone()
+
+    def is_fresh(self, file_id):
+        """Page has been checked not earlier than max_age seconds ago"""
+        state = self.get(file_id)
+        if state is None or state[3] is None:
+            return False
+        return time.time() - state[3] < self._max_age
+
+    def conditional_headers(self, file_id):
+        """Headers for conditional request of page"""
+        headers = {}
+        state = self.get(file_id)
+        if state is not None:
+            if state[0]:
+                headers['If-None-Match'] = state[0]
+            if state[1]:
+                headers['If-Modified-Since'] = state[1]
+        return headers
+
+    def update(self, file_id, etag=None, last_modified=None, digest=None):
+        """Save state of page after check. Empty values keep previous ones"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO pages (id, etag, last_modified, hash, checked) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET '
+                'etag = COALESCE(excluded.etag, etag), '
+                'last_modified = COALESCE(excluded.last_modified, '
+                'last_modified), '
+                'hash = COALESCE(excluded.hash, hash), '
+                'checked = excluded.checked',
+                (file_id, etag, last_modified, digest, time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Export of results into one columnar file.
+
+Usage:
+    python -m storage.export [--config FILE] [--output FILE] [--full]
+
+Items are read from sink of settings.ini and are written into Parquet
+(*.parquet) or Arrow IPC file (*.arrow, it can be memory-mapped by
+pyarrow.ipc.open_file(pyarrow.memory_map(name))). Scalar fields are typed
+columns, photos, inventory, equipment and prices are list columns.
+
+Export is incremental: file keeps hash of every item (column "hash") and
+time of export (metadata of schema). On next run only items modified after
+that time are read, and only new or changed items are added to the file.
+"""
+import argparse
+import logging
+import os
+from os import path
+import re
+import time
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from config.config_parser import ConfigReader
+from storage.crawl_state import data_hash
+from storage.sinks import make_sink
+
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+RE_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+BATCH_SIZE = 10000
+
+
+def make_schema():
+    price = pyarrow.struct([
+        ('name', pyarrow.string()),
+        ('value', pyarrow.float64()),
+        ('currency', pyarrow.string()),
+        ('perweek', pyarrow.bool_()),
+        ('perday', pyarrow.bool_()),
+    ])
+    return pyarrow.schema([
+        ('id', pyarrow.string()),
+        ('hash', pyarrow.string()),
+        ('url', pyarrow.string()),
+        ('title', pyarrow.string()),
+        ('parsingdate', pyarrow.string()),
+        ('realtimeavilbility', pyarrow.bool_()),
+        ('country', pyarrow.string()),
+        ('city', pyarrow.string()),
+        ('year', pyarrow.int16()),
+        ('length', pyarrow.float32()),
+        ('guests', pyarrow.int16()),
+        ('type', pyarrow.string()),
+        ('engine', pyarrow.string()),
+        ('sleeps', pyarrow.string()),
+        ('cabins', pyarrow.int16()),
+        ('bathrooms', pyarrow.int16()),
+        ('about', pyarrow.string()),
+        ('checkin_datetime', pyarrow.string()),
+        ('checkin_location', pyarrow.string()),
+        ('checkout_datetime', pyarrow.string()),
+        ('checkout_location', pyarrow.string()),
+        ('photos', pyarrow.list_(pyarrow.string())),
+        ('inventory', pyarrow.list_(pyarrow.string())),
+        ('equipment', pyarrow.list_(pyarrow.struct([
+            ('category', pyarrow.string()),
+            ('item', pyarrow.string()),
+        ]))),
+        ('prices', pyarrow.list_(price)),
+        ('optional', pyarrow.list_(price)),
+    ])
+
+
+def to_number(value, cast=int):
+    """Number from value like 12, '12' or '12.5m' or None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return cast(value)
+    match = RE_NUMBER.search(str(value))
+    if match is None:
+        return None
+    return cast(float(match.group(0).replace(',', '.')))
+
+
+def price_rows(prices):
+    return [{
+        'name': price.get('name'),
+        'value': to_number(price.get('value'), float),
+        'currency': price.get('currency'),
+        'perweek': bool(price.get('perweek')),
+        'perday': bool(price.get('perday')),
+    } for price in prices or []]
+
+
+def item_row(file_id, data, digest):
+    """Row of columnar file for item"""
+    location = data.get('location') or {}
+    pickup = data.get('pickup') or {}
+    checkin = pickup.get('checkin') or {}
+    checkout = pickup.get('checkout') or {}
+    return {
+        'id': file_id,
+        'hash': digest,
+        'url': data.get('url'),
+        'title': data.get('title'),
+        'parsingdate': data.get('parsingdate'),
+        'realtimeavilbility': data.get('realtimeavilbility'),
+        'country': location.get('country'),
+        'city': location.get('city'),
+        'year': to_number(data.get('year')),
+        'length': to_number(data.get('length'), float),
+        'guests': to_number(data.get('guests')),
+        'type': data.get('type'),
+        'engine': data.get('engine'),
+        'sleeps': data.get('sleeps'),
+        'cabins': to_number(data.get('cabins')),
+        'bathrooms': to_number(data.get('bathrooms')),
+        'about': data.get('about'),
+        'checkin_datetime': checkin.get('datetime'),
+        'checkin_location': checkin.get('location'),
+        'checkout_datetime': checkout.get('datetime'),
+        'checkout_location': checkout.get('location'),
+        'photos': data.get('photos') or [],
+        'inventory': data.get('inventory') or [],
+        'equipment': [{'category': category, 'item': item}
+                      for category, items in
+                      (data.get('equipment') or {}).items()
+                      for item in items],
+        'prices': price_rows((data.get('prices') or {}).get('obligatory')),
+        'optional': price_rows(data.get('optional')),
+    }
+
+
+class ColumnarFile(object):
+    """Parquet or Arrow IPC file of items"""
+
+    def __init__(self, filename):
+        if pyarrow is None:
+            raise ImportError("Package pyarrow is required for export")
+        self.filename = filename
+        self.parquet = filename.endswith('.parquet')
+        self.schema = make_schema()
+
+    def read_state(self):
+        """Tuple (time of last export, {id: hash}) or (0, {})"""
+        if not path.exists(self.filename):
+            return 0, {}
+        if self.parquet:
+            schema = pyarrow.parquet.read_schema(self.filename)
+            table = pyarrow.parquet.read_table(self.filename,
+                                               columns=['id', 'hash'])
+        else:
+            reader = pyarrow.ipc.open_file(pyarrow.memory_map(self.filename))
+            schema = reader.schema
+            table = reader.read_all().select(['id', 'hash'])
+        if schema.remove_metadata() != self.schema:
+            logging.warning("Schema of %s is changed, items are exported "
+                            "again", self.filename)
+            return 0, {}
+        exported = float((schema.metadata or {}).get(b'exported', 0))
+        return exported, dict(zip(table.column('id').to_pylist(),
+                                  table.column('hash').to_pylist()))
+
+    def old_batches(self):
+        """Batches of items of existing file"""
+        if self.parquet:
+            yield from pyarrow.parquet.ParquetFile(
+                self.filename
+            ).iter_batches(batch_size=BATCH_SIZE)
+        else:
+            reader = pyarrow.ipc.open_file(pyarrow.memory_map(self.filename))
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+    def open_writer(self, filename, schema):
+        if self.parquet:
+            return pyarrow.parquet.ParquetWriter(filename, schema)
+        return pyarrow.ipc.new_file(filename, schema)
+
+    def export(self, items, full=False):
+        """
+        Write items which are new or changed together with other items
+        of existing file. items(since) returns iterable of (file_id, data)
+        modified after since (see iter_items of sinks). Returns tuple
+        (number of written items, number of all items in file).
+        """
+        started = time.time()
+        exported, hashes = (0, {}) if full else self.read_state()
+        schema = self.schema.with_metadata({'exported': repr(started)})
+        temp = self.filename + '.tmp'
+        changed = set()
+        total = 0
+        writer = self.open_writer(temp, schema)
+        try:
+            rows = []
+            for file_id, data in items(exported):
+                digest = data_hash(data)
+                if hashes.get(file_id) == digest:
+                    continue
+                hashes[file_id] = digest
+                changed.add(file_id)
+                rows.append(item_row(file_id, data, digest))
+                if len(rows) >= BATCH_SIZE:
+                    writer.write_batch(pyarrow.RecordBatch.from_pylist(
+                        rows, schema=schema))
+                    total += len(rows)
+                    rows = []
+            if rows:
+                writer.write_batch(pyarrow.RecordBatch.from_pylist(
+                    rows, schema=schema))
+                total += len(rows)
+            written = total
+
+            if exported:
+                value_set = pyarrow.array(sorted(changed), pyarrow.string())
+                for batch in self.old_batches():
+                    mask = pyarrow.compute.invert(pyarrow.compute.is_in(
+                        batch.column(0), value_set=value_set
+                    ))
+                    batch = batch.filter(mask)
+                    if batch.num_rows:
+                        writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                            batch.columns, schema=schema))
+                        total += batch.num_rows
+        except BaseException:
+            writer.close()
+            os.remove(temp)
+            raise
+        writer.close()
+        os.replace(temp, self.filename)
+        return written, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', default='settings.ini')
+    parser.add_argument('--output',
+                        help='*.parquet or *.arrow file (exportFile of '
+                             'settings.ini by default)')
+    parser.add_argument('--full', action='store_true',
+                        help='export all items again')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = ConfigReader(file_config=args.config).config_read()
+    # Relative directory of results is in directory of parser
+    if '/' not in config['dirresults'] and '\\' not in config['dirresults']:
+        config['dirresults'] = path.join(ROOT_DIR, config['dirresults'])
+    output = args.output or config.get('exportfile') or 'boats.parquet'
+    if '/' not in output and '\\' not in output:
+        output = path.join(config['dirresults'], output)
+
+    sink = make_sink(config)
+    try:
+        written, total = ColumnarFile(output).export(sink.iter_items,
+                                                     full=args.full)
+    finally:
+        sink.close()
+    logging.info("%d items have been exported into %s (%d items in file)",
+                 written, output, total)
+
+
+if __name__ == '__main__':
+    main()
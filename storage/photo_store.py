@@ -0,0 +1,62 @@
+"""
+Storage of downloaded photos of boats.
+
+Photo is saved by sha1 of its content into sharded directories:
+<directory>/ab/cd/abcd....jpg, so the same photo of several boats is
+saved once and no directory contains too many files.
+"""
+from hashlib import sha1
+import os
+from os import path
+import threading
+from urllib.parse import urlsplit
+
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+
+def photo_extension(url, content_type=None):
+    """Extension of file by url or by Content-Type of response"""
+    extension = path.splitext(urlsplit(url).path)[1].lower()
+    if extension in EXTENSIONS:
+        return extension
+    if content_type:
+        content_type = content_type.split(';')[0].strip().lower()
+    return CONTENT_TYPES.get(content_type, '.jpg')
+
+
+class PhotoStore(object):
+    """
+    Save photos into directory. Paths of photos are relative to root
+    (directory of results), they are written into boat.photos.
+    """
+
+    def __init__(self, directory, root):
+        self._dir = directory
+        self._root = root
+        self._lock = threading.Lock()
+
+    def filename(self, digest, extension):
+        return path.join(self._dir, digest[:2], digest[2:4],
+                         digest + extension)
+
+    def save(self, body, extension='.jpg'):
+        """Save photo if it doesn't exist yet. Returns tuple
+        (path relative to root, True if file has been created)"""
+        filename = self.filename(sha1(body).hexdigest(), extension)
+        relative = path.relpath(filename, self._root).replace(os.sep, '/')
+        with self._lock:
+            if path.exists(filename):
+                return relative, False
+            os.makedirs(path.dirname(filename), exist_ok=True)
+            temp = filename + '.tmp'
+            with open(temp, 'wb') as file:
+                file.write(body)
+            os.replace(temp, filename)
+        return relative, True
@@ -0,0 +1,222 @@
+"""
+Local cache of responses for grab spider in SQLite.
+
+Backend has the same interface as backends from grab.spider.cache_backend
+and is plugged by MySpider.setup_local_cache. When total size of cached
+data exceeds max_size, least recently used responses are removed.
+
+CacheItem interface:
+'url': string,
+'response_url': string,
+'body': string,
+'head': string,
+'response_code': int,
+'cookies': None,
+"""
+from hashlib import sha1
+import logging
+import marshal
+import sqlite3
+import threading
+import time
+import zlib
+
+from weblib.encoding import make_str
+
+from grab.cookie import CookieManager
+from grab.document import Document
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    accessed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+
+CREATE TABLE IF NOT EXISTS kinds (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL
+);
+"""
+
+
+class CacheBackend(object):
+    def __init__(self, database, use_compression=True, spider=None,
+                 max_size=0):
+        self.spider = spider
+        self.use_compression = use_compression
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(database, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._size = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()[0]
+
+    def build_hash(self, url):
+        return sha1(make_str(url)).hexdigest()
+
+    def get_item(self, url, timeout=None):
+        """
+        Returned item should have specific interface. See module docstring.
+        """
+        _hash = self.build_hash(url)
+        query = 'SELECT data FROM cache WHERE id = ?'
+        params = [_hash]
+        if timeout is not None:
+            query += ' AND timestamp > ?'
+            params.append(int(time.time()) - timeout)
+        with self._lock, self.conn:
+            row = self.conn.execute(query, params).fetchone()
+            if row:
+                self.conn.execute('UPDATE cache SET accessed = ? WHERE id = ?',
+                                  (int(time.time()), _hash))
+        if row:
+            return self.unpack_database_value(row[0])
+        return None
+
+    def has_item(self, url, timeout=None):
+        """
+        Test if required item exists in the cache.
+        """
+        query = 'SELECT 1 FROM cache WHERE id = ?'
+        params = [self.build_hash(url)]
+        if timeout is not None:
+            query += ' AND timestamp > ?'
+            params.append(int(time.time()) - timeout)
+        with self._lock:
+            return self.conn.execute(query, params).fetchone() is not None
+
+    def unpack_database_value(self, val):
+        if self.use_compression:
+            val = zlib.decompress(val)
+        return marshal.loads(val)
+
+    def pack_database_value(self, val):
+        dump = marshal.dumps(val)
+        if self.use_compression:
+            return zlib.compress(dump)
+        return dump
+
+    def load_response(self, grab, cache_item):
+        grab.setup_document(cache_item['body'])
+
+        body = cache_item['body']
+
+        def custom_prepare_response_func(transport, grab):
+            doc = Document()
+            doc.head = cache_item['head']
+            doc.body = body
+            doc.code = cache_item['response_code']
+            doc.download_size = len(body)
+            doc.upload_size = 0
+            doc.download_speed = 0
+            doc.url = cache_item['response_url']
+            doc.parse(charset=grab.config['document_charset'])
+            doc.cookies = CookieManager(transport.extract_cookiejar())
+            doc.from_cache = True
+            return doc
+
+        grab.process_request_result(custom_prepare_response_func)
+
+    def save_response(self, url, grab):
+        item = {
+            'url': url,
+            'response_url': grab.doc.url,
+            'body': grab.doc.body,
+            'head': grab.doc.head,
+            'response_code': grab.doc.code,
+            'cookies': None,
+        }
+        self.set_item(url, item)
+
+    def set_item(self, url, item):
+        _hash = self.build_hash(url)
+        data = self.pack_database_value(item)
+        moment = int(time.time())
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT size FROM cache WHERE id = ?',
+                                    (_hash,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO cache '
+                '(id, url, timestamp, accessed, size, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (_hash, url, moment, moment, len(data), data)
+            )
+            self._size += len(data) - (row[0] if row else 0)
+            if self.max_size and self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used items till 90% of max_size"""
+        limit = self.max_size * 0.9
+        removed = 0
+        while self._size > limit:
+            rows = self.conn.execute(
+                'SELECT id, size FROM cache ORDER BY accessed LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            for _hash, size in rows:
+                self.conn.execute('DELETE FROM cache WHERE id = ?', (_hash,))
+                self.conn.execute('DELETE FROM kinds WHERE id = ?', (_hash,))
+                self._size -= size
+                removed += 1
+                if self._size <= limit:
+                    break
+        logging.debug("%d items have been evicted from cache", removed)
+
+    def set_kind(self, url, kind):
+        """Remember name of task for url (is used by replay)"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO kinds (id, kind) VALUES (?, ?)',
+                (self.build_hash(url), kind)
+            )
+
+    def urls(self, kind):
+        """Urls of all cached responses of tasks with determined name"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute(
+                'SELECT cache.url FROM cache JOIN kinds USING (id) '
+                'WHERE kinds.kind = ?', (kind,)
+            )]
+
+    def remove_cache_item(self, url):
+        _hash = self.build_hash(url)
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT size FROM cache WHERE id = ?',
+                                    (_hash,)).fetchone()
+            if row:
+                self.conn.execute('DELETE FROM cache WHERE id = ?', (_hash,))
+                self._size -= row[0]
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM cache')
+            self.conn.execute('DELETE FROM kinds')
+            self._size = 0
+
+    def size(self):
+        with self._lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+
+    def close(self):
+        """Checkpoint WAL into database and close it. Is called by spider
+        and by cache pipeline of grab, so second call does nothing"""
+        with self._lock:
+            if self.conn is None:
+                return
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.conn.close()
+            self.conn = None
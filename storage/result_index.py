@@ -0,0 +1,84 @@
+from os import path
+import logging
+import threading
+
+
+class ResultIndex(object):
+    """
+    In-memory index of ids which already have been scraped.
+
+    Ids are loaded once from a snapshot file (if it's given and exists)
+    or from a scan of the results (function scan returns set of ids).
+    Every new id is appended to the snapshot, so next startup doesn't need
+    the directory scan. Id must be added only after its item is written.
+    Function modified returns time of the last write of results by sink:
+    snapshot is used only if it isn't older. Other files in the directory
+    (state, cache, metrics, etc.) don't make it stale.
+    """
+
+    def __init__(self, dirresults, scan, snapshot=None, modified=None):
+        self._dir = dirresults
+        self._scan = scan
+        self._modified = modified
+        self._snapshot = snapshot or None
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """Fill index from snapshot or from results directory"""
+        if self._snapshot and self._snapshot_is_fresh():
+            with open(self._snapshot, 'r') as file:
+                self._ids = set(line.strip() for line in file if line.strip())
+            logging.info("Index loaded %d ids from snapshot %s",
+                         len(self._ids), self._snapshot)
+        else:
+            self._ids = self._scan()
+            logging.info("Index loaded %d ids from results in %s",
+                         len(self._ids), self._dir)
+            if self._snapshot:
+                self._write_snapshot()
+
+        if self._snapshot:
+            self._file = open(self._snapshot, 'a')
+        return self
+
+    def _snapshot_is_fresh(self):
+        """Snapshot can be used if it's not older than the last write of
+        results (or than results directory if sink doesn't tell it)"""
+        if not path.exists(self._snapshot):
+            return False
+        if self._modified is not None:
+            return path.getmtime(self._snapshot) >= self._modified()
+        if not path.isdir(self._dir):
+            return True
+        return path.getmtime(self._snapshot) >= path.getmtime(self._dir)
+
+    def _write_snapshot(self):
+        """Rewrite snapshot file with all known ids"""
+        with open(self._snapshot, 'w') as file:
+            for file_id in self._ids:
+                file.write(file_id + '\n')
+
+    def __contains__(self, file_id):
+        return file_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, file_id):
+        """Add id to index and append it into snapshot"""
+        with self._lock:
+            if file_id in self._ids:
+                return
+            self._ids.add(file_id)
+            if self._file is not None:
+                self._file.write(file_id + '\n')
+                self._file.flush()
+
+    def close(self):
+        """Close snapshot file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
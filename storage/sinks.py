@@ -0,0 +1,396 @@
+"""
+Sinks for saving results of parsing.
+
+Sink is selected by option "sink" in settings.ini:
+    file   - one pretty-printed json-file per item (default)
+    ndjson - append-only files with one json-object per line
+    sqlite - database with upsert of items (see storage.sqlite_store)
+"""
+from datetime import datetime
+import gzip
+import io
+import json
+import logging
+from os import makedirs, path, scandir, utime
+import queue
+import re
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Id is the first key of every line of ndjson-file
+RE_ID = re.compile(r'\{"id": "([^"\\]*)"')
+# File which is touched by sink before every batch
+MARKER = '.written'
+# Options of files which are relative to dirresults (they aren't items)
+AUXILIARY = ('indexfile', 'statefile', 'queuefile', 'cachefile',
+             'deadletterfile', 'database', 'exportfile', 'metricsfile',
+             'coordinatorfile')
+
+
+def touch(filename):
+    """Set time of modification of file to now (create it if it's absent)"""
+    with open(filename, 'a'):
+        pass
+    utime(filename)
+
+
+def modified(filename):
+    """Time of modification of file or 0 if it's absent"""
+    try:
+        return path.getmtime(filename)
+    except OSError:
+        return 0
+
+
+class FileSink(object):
+    """
+    Save every item into own file: <dirresults>/<id>.json. Hidden files
+    and files with names from exclude (other files of crawl in dirresults,
+    also with suffix of worker: metrics.json, metrics.w2.json) aren't items.
+    """
+    type_file = 'json'
+
+    def __init__(self, dirresults, exclude=()):
+        self._dir = dirresults
+        self._marker = path.join(dirresults, MARKER)
+        self._exclude = None
+        if exclude:
+            self._exclude = re.compile('|'.join(
+                r'%s(\.w\d+)?%s' % (re.escape(root), re.escape(extension))
+                for root, extension in map(path.splitext, exclude)
+            ))
+
+    def filename(self, file_id):
+        return path.join(self._dir, "{0}.{1}".format(file_id, self.type_file))
+
+    def _item_id(self, name):
+        """Id of item which is saved in file with name or None"""
+        suffix = '.%s' % self.type_file
+        if not name.endswith(suffix) or name.startswith('.'):
+            return None
+        if self._exclude is not None and self._exclude.fullmatch(name):
+            return None
+        return name[:-len(suffix)]
+
+    def scan_ids(self):
+        """Ids of all saved items"""
+        ids = set()
+        if not path.isdir(self._dir):
+            return ids
+        for entry in scandir(self._dir):
+            file_id = self._item_id(entry.name)
+            if file_id is not None:
+                ids.add(file_id)
+        return ids
+
+    def iter_items(self, since=0):
+        """Saved items (file_id, data) which files have been modified
+        not earlier than since (timestamp)"""
+        if not path.isdir(self._dir):
+            return
+        for entry in scandir(self._dir):
+            file_id = self._item_id(entry.name)
+            if file_id is None or entry.stat().st_mtime < since:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except ValueError:
+                logging.warning("Broken file %s", entry.path)
+                continue
+            yield file_id, data
+
+    def modified(self):
+        """Time of the last batch (only this sink changes it)"""
+        return modified(self._marker)
+
+    def item_modified(self, file_id):
+        """Time of saving of item or None if it isn't saved"""
+        return modified(self.filename(file_id)) or None
+
+    def write_batch(self, items):
+        touch(self._marker)
+        for file_id, data in items:
+            filename = self.filename(file_id)
+            with open(filename, 'w') as file:
+                file.write(json.dumps(data, ensure_ascii=False, indent=2))
+            logging.info("File %s has beed saved!", filename)
+
+    def close(self):
+        pass
+
+
+class NdjsonSink(object):
+    """
+    Append items as lines into <dirresults>/results-<date>.ndjson[.gz|.zst].
+    File is rotated when it reaches rotate_size bytes (of uncompressed data)
+    or when it's older than rotate_interval seconds. Zero disables a limit.
+    """
+    type_file = 'ndjson'
+    extensions = {'': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, dirresults, compression='', rotate_size=0,
+                 rotate_interval=0):
+        if compression not in self.extensions:
+            raise ValueError("Unknown compression: %s" % compression)
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("Package zstandard is required for zstd")
+        self._dir = dirresults
+        self._marker = path.join(dirresults, MARKER)
+        self._compression = compression
+        self._rotate_size = rotate_size
+        self._rotate_interval = rotate_interval
+        self._file = None
+        self._opened = 0
+        self._written = 0
+
+    def _open(self):
+        """Open new file for appending items"""
+        filename = path.join(self._dir, "results-{0}.{1}{2}".format(
+            datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+            self.type_file,
+            self.extensions[self._compression]
+        ))
+        if self._compression == 'gzip':
+            self._file = gzip.open(filename, 'at', encoding='utf-8')
+        elif self._compression == 'zstd':
+            raw = open(filename, 'ab')
+            writer = zstandard.ZstdCompressor().stream_writer(raw)
+            self._file = io.TextIOWrapper(writer, encoding='utf-8')
+        else:
+            self._file = open(filename, 'a', encoding='utf-8')
+        self._opened = time.time()
+        self._written = 0
+        logging.info("File %s has beed opened for results", filename)
+
+    def _need_rotate(self):
+        if self._rotate_size and self._written >= self._rotate_size:
+            return True
+        if self._rotate_interval \
+                and time.time() - self._opened >= self._rotate_interval:
+            return True
+        return False
+
+    def _files(self):
+        """Names of all ndjson-files in results directory"""
+        if not path.isdir(self._dir):
+            return []
+        return sorted(
+            entry.path for entry in scandir(self._dir)
+            if entry.name.startswith('results-')
+            and '.%s' % self.type_file in entry.name
+        )
+
+    def _read_lines(self, filename):
+        if filename.endswith('.gz'):
+            with gzip.open(filename, 'rt', encoding='utf-8') as file:
+                yield from file
+        elif filename.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError("Package zstandard is required for zstd")
+            with open(filename, 'rb') as raw:
+                reader = zstandard.ZstdDecompressor().stream_reader(raw)
+                yield from io.TextIOWrapper(reader, encoding='utf-8')
+        else:
+            with open(filename, 'r', encoding='utf-8') as file:
+                yield from file
+
+    def scan_ids(self):
+        """Ids of all saved items (reads every ndjson-file)"""
+        ids = set()
+        for filename in self._files():
+            for line in self._read_lines(filename):
+                try:
+                    ids.add(json.loads(line)['id'])
+                except (ValueError, KeyError):
+                    logging.warning("Broken line in %s", filename)
+        return ids
+
+    def iter_items(self, since=0):
+        """Saved items (file_id, data) from files which have been modified
+        not earlier than since (timestamp). Item which has been saved
+        several times is yielded once (the newest version)"""
+        files = [filename for filename in self._files()
+                 if path.getmtime(filename) >= since]
+        # The first pass finds the last line of every id without parsing
+        last = {}
+        for number, filename in enumerate(files):
+            for position, line in enumerate(self._read_lines(filename)):
+                match = RE_ID.match(line)
+                if match is not None:
+                    last[match.group(1)] = (number, position)
+
+        for number, filename in enumerate(files):
+            for position, line in enumerate(self._read_lines(filename)):
+                match = RE_ID.match(line)
+                if match is None or last.get(match.group(1)) != (number,
+                                                                 position):
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    logging.warning("Broken line in %s", filename)
+                    continue
+                yield data.pop('id'), data
+
+    def modified(self):
+        """Time of the last batch (only this sink changes it)"""
+        return modified(self._marker)
+
+    def item_modified(self, file_id):
+        """Time of saving of item is unknown without reading of files"""
+        return None
+
+    def write_batch(self, items):
+        touch(self._marker)
+        if self._file is None or self._need_rotate():
+            self.close()
+            self._open()
+        lines = []
+        for file_id, data in items:
+            record = dict(id=file_id)
+            record.update(data)
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        chunk = ''.join(lines)
+        self._file.write(chunk)
+        self._file.flush()
+        self._written += len(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BackgroundWriter(object):
+    """
+    Pass items to sink from own thread by batches. A batch is written
+    when it has batch_size items or flush_interval seconds are passed.
+    Function on_saved(file_id, context) is called for every item of batch
+    which has been written by sink (items of failed batch aren't passed
+    to it), context is the value passed to write.
+    Records (see extraction.models) are serialized by to_dict here, out of
+    threads of spider. Duration of saving of batches is measured by
+    metrics (if it's given).
+    """
+    _stop = object()
+
+    def __init__(self, sink, batch_size=100, flush_interval=5, metrics=None,
+                 on_saved=None):
+        self.sink = sink
+        self.metrics = metrics
+        self._on_saved = on_saved
+        self._batch_size = max(batch_size, 1)
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name='result-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, file_id, data, context=None):
+        self._queue.put((file_id, data, context))
+
+    def _run(self):
+        batch = []
+        deadline = time.time() + self._flush_interval
+        while True:
+            try:
+                item = self._queue.get(
+                    timeout=max(deadline - time.time(), 0.01)
+                )
+            except queue.Empty:
+                item = None
+
+            if item is self._stop:
+                self._flush(batch)
+                return
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self._batch_size or time.time() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.time() + self._flush_interval
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        if self.metrics is None:
+            self._write(batch)
+            return
+        with self.metrics.time('save_result'):
+            saved = self._write(batch)
+        if saved:
+            self.metrics.counter(
+                'items_saved_total', "Items which have been saved"
+            ).inc(len(batch))
+        self.metrics.gauge(
+            'writer_queue', "Items which are waiting for saving"
+        ).set(self._queue.qsize())
+
+    def _write(self, batch):
+        try:
+            self.sink.write_batch([
+                (file_id, data.to_dict() if hasattr(data, 'to_dict')
+                 else data)
+                for file_id, data, _ in batch
+            ])
+        except Exception:
+            logging.exception("Batch of %d items hasn't been saved",
+                              len(batch))
+            return False
+        if self._on_saved is not None:
+            for file_id, _, context in batch:
+                self._on_saved(file_id, context)
+        return True
+
+    def close(self):
+        """Write all queued items and close sink"""
+        self._queue.put(self._stop)
+        self._thread.join()
+        self.sink.close()
+
+
+def auxiliary_files(config):
+    """Names of files of crawl which are kept in dirresults with items"""
+    names = []
+    for key in AUXILIARY:
+        filename = config.get(key)
+        if filename and '/' not in filename and '\\' not in filename:
+            names.append(filename)
+    return names
+
+
+def make_sink(config, catalog=False):
+    """Create sink determined in config. Sink of catalog saves cards of
+    boats into subdirectory catalogDir (or into table "cards")"""
+    kind = config.get('sink') or 'file'
+    dirresults = config['dirresults']
+    if catalog and kind != 'sqlite':
+        dirresults = path.join(dirresults,
+                               config.get('catalogdir') or 'catalog')
+        makedirs(dirresults, exist_ok=True)
+    if kind == 'file':
+        return FileSink(dirresults,
+                        exclude=() if catalog else auxiliary_files(config))
+    elif kind == 'ndjson':
+        return NdjsonSink(
+            dirresults,
+            compression=config.get('compression') or '',
+            rotate_size=(config.get('rotatesize') or 0) * 1024 * 1024,
+            rotate_interval=config.get('rotateinterval') or 0
+        )
+    elif kind == 'sqlite':
+        from storage.sqlite_store import CardSink, SqliteSink
+        database = config.get('database') or 'results.sqlite'
+        if '/' not in database and '\\' not in database:
+            database = path.join(config['dirresults'], database)
+        if catalog:
+            return CardSink(database)
+        return SqliteSink(database)
+    raise ValueError("Unknown sink: %s" % kind)
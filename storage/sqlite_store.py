@@ -0,0 +1,318 @@
+"""
+SQLite storage of results.
+
+Boats are saved into table "boats" by upsert with key is id of page, lists
+are saved into tables "photos", "equipment" and "prices". Cards of boats
+from listing pages (catalog mode) are saved into table "cards". Database
+works in WAL mode and every batch of items is saved in one transaction.
+"""
+import calendar
+from datetime import datetime
+import json
+import logging
+import sqlite3
+import threading
+
+from storage.sinks import MARKER, modified, touch
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boats (
+    id TEXT PRIMARY KEY,
+    url TEXT,
+    title TEXT,
+    parsingdate TEXT,
+    realtime INTEGER,
+    country TEXT,
+    city TEXT,
+    year INTEGER,
+    length TEXT,
+    guests INTEGER,
+    type TEXT,
+    engine TEXT,
+    sleeps TEXT,
+    cabins INTEGER,
+    bathrooms INTEGER,
+    about TEXT,
+    inventory TEXT,
+    pickup TEXT,
+    data TEXT,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS boats_location ON boats (country, city);
+CREATE INDEX IF NOT EXISTS boats_year ON boats (year);
+
+CREATE TABLE IF NOT EXISTS photos (
+    boat_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT,
+    PRIMARY KEY (boat_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    boat_id TEXT NOT NULL,
+    category TEXT,
+    item TEXT
+);
+CREATE INDEX IF NOT EXISTS equipment_boat ON equipment (boat_id);
+
+CREATE TABLE IF NOT EXISTS prices (
+    boat_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    value REAL,
+    currency TEXT,
+    perweek INTEGER,
+    perday INTEGER,
+    PRIMARY KEY (boat_id, kind, position)
+);
+CREATE INDEX IF NOT EXISTS prices_value ON prices (value);
+"""
+
+CARDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    url TEXT,
+    title TEXT,
+    parsingdate TEXT,
+    price REAL,
+    currency TEXT,
+    location TEXT,
+    data TEXT,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+UPSERT_CARD = """
+INSERT INTO cards (id, url, title, parsingdate, price, currency, location,
+                   data, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET
+    url = excluded.url,
+    title = excluded.title,
+    parsingdate = excluded.parsingdate,
+    price = excluded.price,
+    currency = excluded.currency,
+    location = excluded.location,
+    data = excluded.data,
+    updated = CURRENT_TIMESTAMP
+"""
+
+UPSERT_BOAT = """
+INSERT INTO boats (id, url, title, parsingdate, realtime, country, city,
+                   year, length, guests, type, engine, sleeps, cabins,
+                   bathrooms, about, inventory, pickup, data, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+        CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET
+    url = excluded.url,
+    title = excluded.title,
+    parsingdate = excluded.parsingdate,
+    realtime = excluded.realtime,
+    country = excluded.country,
+    city = excluded.city,
+    year = excluded.year,
+    length = excluded.length,
+    guests = excluded.guests,
+    type = excluded.type,
+    engine = excluded.engine,
+    sleeps = excluded.sleeps,
+    cabins = excluded.cabins,
+    bathrooms = excluded.bathrooms,
+    about = excluded.about,
+    inventory = excluded.inventory,
+    pickup = excluded.pickup,
+    data = excluded.data,
+    updated = CURRENT_TIMESTAMP
+"""
+
+
+def to_float(value):
+    """Price value as number or None"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SqliteSink(object):
+    """Save items into SQLite database"""
+    type_file = 'sqlite'
+
+    def __init__(self, filename):
+        self._lock = threading.Lock()
+        self._marker = filename + MARKER
+        self._conn = sqlite3.connect(filename, timeout=60,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def scan_ids(self):
+        """Ids of all saved items"""
+        with self._lock:
+            return set(row[0] for row in
+                       self._conn.execute('SELECT id FROM boats'))
+
+    def iter_items(self, since=0):
+        """Saved items (file_id, data) which have been updated not earlier
+        than since (timestamp)"""
+        moment = datetime.utcfromtimestamp(since).strftime(
+            '%Y-%m-%d %H:%M:%S'
+        )
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT id, data FROM boats WHERE updated >= ?', (moment,)
+            )
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for file_id, data in rows:
+                yield file_id, json.loads(data)
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+
+    def exists(self, file_id):
+        """Check on boat exists with that id"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM boats WHERE id = ?', (file_id,)
+            ).fetchone() is not None
+
+    def modified(self):
+        """Time of the last batch (only this sink changes it)"""
+        return modified(self._marker)
+
+    def item_modified(self, file_id):
+        """Time of saving of boat (with precision of second) or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT updated FROM boats WHERE id = ?', (file_id,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return calendar.timegm(
+            datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S').utctimetuple()
+        )
+
+    def write_batch(self, items):
+        touch(self._marker)
+        with self._lock, self._conn:
+            for file_id, data in items:
+                self._write(file_id, data)
+        logging.info("%d items have been saved into database", len(items))
+
+    def _write(self, file_id, data):
+        location = data.get('location') or {}
+        self._conn.execute(UPSERT_BOAT, (
+            file_id,
+            data.get('url'),
+            data.get('title'),
+            data.get('parsingdate'),
+            int(bool(data.get('realtimeavilbility'))),
+            location.get('country'),
+            location.get('city'),
+            data.get('year'),
+            data.get('length'),
+            data.get('guests'),
+            data.get('type'),
+            data.get('engine'),
+            data.get('sleeps'),
+            data.get('cabins'),
+            data.get('bathrooms'),
+            data.get('about'),
+            json.dumps(data.get('inventory'), ensure_ascii=False),
+            json.dumps(data.get('pickup'), ensure_ascii=False),
+            json.dumps(data, ensure_ascii=False),
+        ))
+
+        for table in ('photos', 'equipment', 'prices'):
+            self._conn.execute(
+                'DELETE FROM %s WHERE boat_id = ?' % table, (file_id,)
+            )
+
+        self._conn.executemany(
+            'INSERT INTO photos (boat_id, position, url) VALUES (?, ?, ?)',
+            [(file_id, position, url)
+             for position, url in enumerate(data.get('photos') or [])]
+        )
+        self._conn.executemany(
+            'INSERT INTO equipment (boat_id, category, item) VALUES (?, ?, ?)',
+            [(file_id, category, item)
+             for category, values in (data.get('equipment') or {}).items()
+             for item in values]
+        )
+
+        prices = data.get('prices') or {}
+        lists = [('obligatory', prices.get('obligatory')),
+                 ('optional', data.get('optional'))]
+        self._conn.executemany(
+            'INSERT INTO prices (boat_id, kind, position, name, value, '
+            'currency, perweek, perday) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(file_id, kind, position, price.get('name'),
+              to_float(price.get('value')), price.get('currency'),
+              int(bool(price.get('perweek'))), int(bool(price.get('perday'))))
+             for kind, values in lists
+             for position, price in enumerate(values or [])]
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CardSink(object):
+    """Save cards of boats into table "cards" of SQLite database"""
+    type_file = 'sqlite'
+
+    def __init__(self, filename):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=60,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(CARDS_SCHEMA)
+        self._conn.commit()
+
+    def scan_ids(self):
+        """Ids of all saved cards"""
+        with self._lock:
+            return set(row[0] for row in
+                       self._conn.execute('SELECT id FROM cards'))
+
+    def iter_items(self, since=0):
+        """Saved cards (file_id, data) which have been updated not earlier
+        than since (timestamp)"""
+        moment = datetime.utcfromtimestamp(since).strftime(
+            '%Y-%m-%d %H:%M:%S'
+        )
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT id, data FROM cards WHERE updated >= ?', (moment,)
+            )
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for file_id, data in rows:
+                yield file_id, json.loads(data)
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+
+    def write_batch(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT_CARD, [
+                (file_id,
+                 data.get('url'),
+                 data.get('title'),
+                 data.get('parsingdate'),
+                 to_float((data.get('price') or {}).get('value')),
+                 (data.get('price') or {}).get('currency'),
+                 data.get('location'),
+                 json.dumps(data, ensure_ascii=False))
+                for file_id, data in items
+            ])
+        logging.info("%d cards have been saved into database", len(items))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,128 @@
+"""
+Durable queue of tasks for grab spider in SQLite.
+
+Task which is taken from queue is marked as active and is removed only
+when spider has processed it (see MySpider.process_handler_result), so
+after crash or ^C active tasks are returned into queue on next start.
+Task isn't added if the same task (name and url) is waiting in queue.
+"""
+import calendar
+import logging
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+
+from grab.spider.queue_backend.base import QueueInterface
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    schedule_time REAL NOT NULL,
+    active INTEGER NOT NULL DEFAULT 0,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (active, priority);
+CREATE INDEX IF NOT EXISTS tasks_url ON tasks (name, url);
+"""
+
+
+class QueueBackend(QueueInterface):
+    def __init__(self, spider_name, database=None, **kwargs):
+        super(QueueBackend, self).__init__(spider_name, **kwargs)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(database, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            # Tasks which have been active when spider stopped
+            restored = self.conn.execute(
+                'UPDATE tasks SET active = 0 WHERE active = 1'
+            ).rowcount
+        self.resumed = self.size()
+        if self.resumed:
+            logging.info("Queue has %d tasks from previous run "
+                         "(%d were active)", self.resumed, restored)
+
+    def put(self, task, priority, schedule_time=None):
+        if schedule_time is None:
+            moment = time.time()
+        else:
+            moment = calendar.timegm(schedule_time.utctimetuple())
+        queue_id = task.get('queue_id')
+        # Don't keep id of row inside of pickled task
+        task.queue_id = None
+        data = pickle.dumps(task, pickle.HIGHEST_PROTOCOL)
+        task.queue_id = queue_id
+
+        with self._lock, self.conn:
+            if queue_id is not None:
+                # Task is repeated (e.g. after network error)
+                updated = self.conn.execute(
+                    'UPDATE tasks SET priority = ?, schedule_time = ?, '
+                    'active = 0, data = ? WHERE id = ?',
+                    (priority, moment, data, queue_id)
+                ).rowcount
+                if updated:
+                    return
+            duplicate = self.conn.execute(
+                'SELECT 1 FROM tasks WHERE name = ? AND url = ? '
+                'AND active = 0', (task.name, task.url)
+            ).fetchone()
+            if duplicate:
+                logging.debug("Task %s is in queue already: %s", task.name,
+                              task.url)
+                return
+            task.queue_id = self.conn.execute(
+                'INSERT INTO tasks (name, url, priority, schedule_time, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (task.name, task.url, priority, moment, data)
+            ).lastrowid
+
+    def get(self):
+        """
+        Return `Task` object or raise `Queue.Empty` exception
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                'SELECT id, data FROM tasks WHERE active = 0 '
+                'AND schedule_time <= ? ORDER BY priority, id LIMIT 1',
+                (time.time(),)
+            ).fetchone()
+            if row is None:
+                raise queue.Empty()
+            self.conn.execute('UPDATE tasks SET active = 1 WHERE id = ?',
+                              (row[0],))
+        task = pickle.loads(row[1])
+        task.queue_id = row[0]
+        return task
+
+    def task_done(self, task):
+        """Remove processed task from queue"""
+        queue_id = task.get('queue_id')
+        if queue_id is None:
+            return
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM tasks WHERE id = ?', (queue_id,))
+
+    def size(self):
+        """Number of waiting tasks (active tasks are not counted)"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM tasks WHERE active = 0'
+            ).fetchone()[0]
+
+    def clear(self):
+        """Grab calls it when spider stops. Tasks are kept for resume,
+        use purge for removing them"""
+
+    def purge(self):
+        """Remove all tasks from the queue."""
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM tasks')
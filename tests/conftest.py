@@ -0,0 +1,40 @@
+"""
+Fixtures of tests: stub server with synthetic pages (see benchmark) and
+crawls of it by asyncio engine with settings from settings.ini.
+"""
+from os import path
+
+import pytest
+
+from benchmark.stub_server import make_server
+from config.config_parser import ConfigReader
+from tests.crawling import ITEMS, LISTINGS
+
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+@pytest.fixture
+def server():
+    server = make_server(items=ITEMS, listings=LISTINGS).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config(server, tmp_path):
+    """Settings of crawl of stub server into temporary directory"""
+    config = ConfigReader(
+        file_config=path.join(ROOT_DIR, 'settings.ini')
+    ).config_read()
+    config.update(
+        initialurl=server.base_url + '/b/',
+        dirresults=str(tmp_path),
+        uselog=False,
+        numthreads=10,
+        hostconcurrency=10,
+        retrydelay=0,
+        flushinterval=1,
+    )
+    return config
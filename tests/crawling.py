@@ -0,0 +1,33 @@
+"""
+Crawls of stub server by asyncio engine for tests
+"""
+
+
+ITEMS = 60
+LISTINGS = 6
+
+
+def make_spider(config):
+    import parser
+    return parser.MySpider(
+        thread_number=config['numthreads'],
+        network_try_limit=config['network_try_limit'],
+        task_try_limit=config['parsetrylimit'],
+        ext_config=dict(config)
+    )
+
+
+def crawl(config):
+    """Crawl stub server by asyncio engine. Returns engine"""
+    from engine.async_engine import AsyncEngine
+    engine = AsyncEngine(make_spider(config),
+                         concurrency=config['numthreads'],
+                         per_host=config['hostconcurrency'])
+    engine.run()
+    return engine
+
+
+def saved_ids(config):
+    """Ids of items which have been written by sink"""
+    from storage.sinks import make_sink
+    return make_sink(config).scan_ids()
@@ -0,0 +1,132 @@
+"""
+Crawl of stub server by asyncio engine.
+"""
+import json
+from os import path
+import threading
+
+import aiohttp
+import pytest
+
+from benchmark.stub_server import StubHandler, make_server
+from config.config_parser import ConfigError, ConfigReader
+from engine.async_engine import AsyncDocument, AsyncEngine
+import parser
+from tests.crawling import ITEMS, LISTINGS, crawl, make_spider, saved_ids
+
+
+def test_crawl_saves_all_items(config):
+    engine = crawl(config)
+    assert saved_ids(config) == set('boat-%d' % num for num in range(ITEMS))
+    assert engine.counters['task-item'] == ITEMS
+    assert engine.counters['task-page'] == LISTINGS - 1
+    assert 'handler-error' not in engine.counters
+
+
+def test_handlers_are_run_out_of_event_loop(config, monkeypatch):
+    task_item = parser.MySpider.task_item
+    threads = set()
+
+    def recorded(self, grab, task):
+        threads.add(threading.current_thread())
+        return task_item(self, grab, task)
+
+    monkeypatch.setattr(parser.MySpider, 'task_item', recorded)
+    crawl(config)
+    assert threads
+    assert threading.main_thread() not in threads
+    assert len(saved_ids(config)) == ITEMS
+
+
+def test_queued_results_are_saved_on_error_of_engine(config, monkeypatch):
+    def has_pending_items(self):
+        raise RuntimeError("Engine has failed")
+
+    # Results are waiting in writer till shutdown of spider
+    config.update(batchsize=1000, flushinterval=1000)
+    monkeypatch.setattr(parser.MySpider, 'has_pending_items',
+                        has_pending_items)
+    with pytest.raises(RuntimeError):
+        crawl(config)
+    assert len(saved_ids(config)) == ITEMS
+
+
+def test_item_which_is_not_downloaded_is_dead_lettered(config, monkeypatch):
+    fetch = AsyncEngine._fetch
+    calls = []
+
+    async def failing(self, session, task, proxy=None):
+        if not task.url.endswith('/boat-3'):
+            return await fetch(self, session, task, proxy)
+        calls.append(task)
+        if len(calls) == 1:
+            # Page without data of boat is repeated by retry policy
+            return AsyncDocument(task.url, 200, {}, b'<html></html>',
+                                 'utf-8')
+        raise aiohttp.ClientError("Connection reset")
+
+    monkeypatch.setattr(AsyncEngine, '_fetch', failing)
+    config.update(network_try_limit=2)
+    engine = crawl(config)
+    assert len(saved_ids(config)) == ITEMS - 1
+    with open(path.join(config['dirresults'],
+                        config['deadletterfile'])) as file:
+        letters = [json.loads(line) for line in file]
+    assert [(letter['url'].split('/')[-1], letter['reason'])
+            for letter in letters] == [('boat-3', 'network errors')]
+    # Repeat of url can be scheduled again
+    assert calls[-1].task_try_count == 2
+    assert not engine.spider.retry_policy._waiting
+
+
+def test_replay_takes_pages_from_cache(config, server):
+    config.update(usecache=True)
+    crawl(config)
+    server.shutdown()
+
+    config.update(replay=True)
+    engine = crawl(config)
+    assert engine.counters['request'] == 0
+    assert engine.counters['cache-hit'] == ITEMS
+    assert engine.counters['task-item'] == ITEMS
+
+
+def test_requests_go_through_proxy(config, server, monkeypatch, tmp_path):
+    proxy = make_server(items=ITEMS, listings=LISTINGS).start()
+    servers = []
+    do_get = StubHandler.do_GET
+
+    def recorded(self):
+        servers.append(self.server)
+        do_get(self)
+
+    monkeypatch.setattr(StubHandler, 'do_GET', recorded)
+    proxies = tmp_path / 'proxy.txt'
+    proxies.write_text('%s:%d\n' % proxy.server_address[:2])
+    config.update(useproxy=True, listproxies=str(proxies))
+    spider = make_spider(config)
+    spider.setup_proxies()
+    try:
+        engine = AsyncEngine(spider, concurrency=10, per_host=10)
+        engine.run()
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+    assert len(saved_ids(config)) == ITEMS
+    assert servers and set(servers) == {proxy}
+    # Requests wait while proxy has limit of requests at once
+    assert engine.counters['proxy-wait']
+    # Results of requests are passed to scheduler
+    assert 'requests=%d errors=0' % len(servers) \
+        in spider.proxy_scheduler.render_stats()
+
+
+@pytest.mark.parametrize('options', [
+    'durableQueue=1',
+    'useproxy=1\ntypeproxy=socks5',
+])
+def test_unsupported_options_are_refused(tmp_path, options):
+    settings = tmp_path / 'settings.ini'
+    settings.write_text('[MainSettings]\nengine=asyncio\n%s\n' % options)
+    with pytest.raises(ConfigError, match='asyncio engine'):
+        ConfigReader(file_config=str(settings)).config_read()
@@ -0,0 +1,48 @@
+"""
+Parallel discovery of listing pages when one of them can't be downloaded.
+"""
+from os import path
+import sqlite3
+
+import aiohttp
+import pytest
+
+from engine.async_engine import AsyncEngine
+from engine.coordinator import PAGE_TRIES
+from tests.crawling import ITEMS, LISTINGS, crawl, saved_ids
+
+
+@pytest.fixture
+def lost_page(monkeypatch):
+    """Listing page 2 isn't downloaded by any try"""
+    fetch = AsyncEngine._fetch
+
+    async def failing(self, session, task, proxy=None):
+        if task.get('page_num') == 2:
+            raise aiohttp.ClientError("Connection refused")
+        return await fetch(self, session, task, proxy)
+
+    monkeypatch.setattr(AsyncEngine, '_fetch', failing)
+
+
+@pytest.mark.parametrize('coordinatorfile', ['', 'coordinator.sqlite'])
+def test_pages_after_lost_page_are_parsed(config, lost_page, coordinatorfile):
+    config.update(discovery='parallel', discoverywindow=2,
+                  network_try_limit=2, coordinatorfile=coordinatorfile)
+    engine = crawl(config)
+    # Only items of page 2 are lost, not of pages 4 and 6 after it
+    assert len(saved_ids(config)) == ITEMS - ITEMS // LISTINGS
+    assert engine.counters['task-page'] == LISTINGS - 2
+
+
+def test_lost_page_is_returned_to_coordinator(config, lost_page):
+    config.update(discovery='parallel', discoverywindow=2,
+                  network_try_limit=2, coordinatorfile='coordinator.sqlite')
+    crawl(config)
+    conn = sqlite3.connect(path.join(config['dirresults'],
+                                     'coordinator.sqlite'))
+    # Page is claimed again after every failure till it's lost
+    assert conn.execute(
+        'SELECT released, done FROM pages WHERE num = 2'
+    ).fetchone() == (PAGE_TRIES, 1)
+    conn.close()
@@ -0,0 +1,50 @@
+"""
+False positives of Bloom filter of frontier don't drop items, items are
+kept in memory only while they're in flight.
+"""
+import pytest
+
+from engine.frontier import BloomFilter, Frontier
+from tests.crawling import ITEMS, crawl, saved_ids
+
+
+@pytest.mark.parametrize('mode', ['rewrite_files', 'incremental'])
+def test_saved_items_are_parsed_again_with_false_positives(config, mode,
+                                                           monkeypatch):
+    crawl(config)
+    assert len(saved_ids(config)) == ITEMS
+
+    # Every id is "seen" by filter
+    monkeypatch.setattr(BloomFilter, '__contains__', lambda self, key: True)
+    config.update({mode: True, 'maxage': 0})
+    engine = crawl(config)
+    assert engine.counters['task-item'] == ITEMS
+
+
+def test_item_is_not_queued_again_till_it_is_finished():
+    confirmed = []
+
+    def confirm(file_id):
+        confirmed.append(file_id)
+        return False
+
+    frontier = Frontier(BloomFilter(capacity=100), confirm=confirm)
+    assert frontier.add('boat-1')
+    assert not frontier.add('boat-1')
+    # Item is parsed or waits for writer
+    frontier.started('boat-1')
+    assert not frontier.add('boat-1')
+    assert confirmed == []
+
+    frontier.finished('boat-1')
+    assert frontier.add('boat-1')
+    assert confirmed == ['boat-1']
+
+
+@pytest.mark.parametrize('parseprocesses', [0, 2])
+def test_saved_items_are_not_kept_in_memory(config, parseprocesses):
+    config.update(parseprocesses=parseprocesses)
+    engine = crawl(config)
+    assert len(saved_ids(config)) == ITEMS
+    assert not engine.spider.frontier._pending
+    assert not engine.spider.frontier._active
@@ -0,0 +1,43 @@
+"""
+Pool of parsing processes when its worker dies.
+"""
+import os
+import signal
+import threading
+import time
+
+from benchmark.corpus import synthetic_corpus
+from extraction.pool import ParsePool
+
+
+def test_pages_are_parsed_after_death_of_worker():
+    _, items = synthetic_corpus(items=6, listings=1)
+    results = []
+    parsed = threading.Semaphore(0)
+
+    def callback(context, result):
+        results.append((context, result))
+        parsed.release()
+
+    pool = ParsePool(1, callback)
+    try:
+        url, html = items[0]
+        pool.submit(0, url, html.encode('utf-8'), 'utf-8')
+        assert parsed.acquire(timeout=30)
+
+        # Pages which are in pool and which are submitted after the death
+        for number, (url, html) in enumerate(items[1:3], 1):
+            pool.submit(number, url, html.encode('utf-8'), 'utf-8')
+        for pid in list(pool._executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+        for number, (url, html) in enumerate(items[3:], 3):
+            pool.submit(number, url, html.encode('utf-8'), 'utf-8')
+
+        for _ in items[1:]:
+            assert parsed.acquire(timeout=30)
+        assert pool.is_idle()
+    finally:
+        pool.close()
+    assert sorted(context for context, _ in results) == list(range(len(items)))
+    assert all(boat is not None for _, (boat, _) in results)
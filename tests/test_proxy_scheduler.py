@@ -0,0 +1,40 @@
+"""
+Scheduler of proxies doesn't give proxy which is paused or busy.
+"""
+from grab.proxylist import Proxy
+
+from engine.proxy_scheduler import BUSY_DELAY, ProxyScheduler
+
+
+def make_scheduler(count):
+    scheduler = ProxyScheduler(backoff=30)
+    scheduler.update([Proxy('127.0.0.%d' % num, 3128, None, None, 'http')
+                      for num in range(1, count + 1)])
+    return scheduler
+
+
+def test_busy_proxy_is_not_given():
+    scheduler = make_scheduler(1)
+    proxy = scheduler.acquire()
+    assert proxy is not None
+    # Limit of new proxy is one request at once
+    assert scheduler.acquire() is None
+    assert scheduler.delay() == BUSY_DELAY
+
+    scheduler.report(proxy.get_address(), True, latency=0.1, code=200)
+    assert scheduler.delay() == 0
+    assert scheduler.acquire() == proxy
+
+
+def test_paused_proxies_are_waited():
+    scheduler = make_scheduler(2)
+    for _ in range(2):
+        scheduler.report(scheduler.acquire().get_address(), False)
+    assert scheduler.acquire() is None
+    assert 29 < scheduler.delay() <= 30
+
+
+def test_empty_list_does_not_delay():
+    scheduler = ProxyScheduler()
+    assert scheduler.acquire() is None
+    assert scheduler.delay() == 0
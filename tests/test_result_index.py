@@ -0,0 +1,50 @@
+"""
+Snapshot of index of saved ids is used while sink hasn't written results.
+"""
+import os
+
+from storage.result_index import ResultIndex
+from storage.sinks import FileSink
+
+
+def load(tmp_path, sink, scans):
+    def scan():
+        scans.append(True)
+        return sink.scan_ids()
+
+    return ResultIndex(str(tmp_path), scan,
+                       snapshot=str(tmp_path / '.index'),
+                       modified=sink.modified).load()
+
+
+def test_snapshot_is_used_when_other_files_are_changed(tmp_path):
+    sink = FileSink(str(tmp_path))
+    sink.write_batch([('boat-1', {'url': 'boat-1'})])
+    scans = []
+    index = load(tmp_path, sink, scans)
+    index.add('boat-1')
+    index.close()
+    assert len(scans) == 1
+
+    # Files of state, metrics, etc. are written after the snapshot
+    for name in ('metrics.json', 'state.sqlite', 'deadletter.ndjson'):
+        (tmp_path / name).write_text('{}')
+    index = load(tmp_path, sink, scans)
+    index.close()
+    assert len(scans) == 1
+    assert 'boat-1' in index
+
+
+def test_snapshot_is_stale_after_write_of_sink(tmp_path):
+    sink = FileSink(str(tmp_path))
+    scans = []
+    load(tmp_path, sink, scans).close()
+    snapshot = str(tmp_path / '.index')
+    os.utime(snapshot, (0, 0))
+
+    # Item is written but id hasn't been added (crash before it)
+    sink.write_batch([('boat-1', {'url': 'boat-1'})])
+    index = load(tmp_path, sink, scans)
+    index.close()
+    assert len(scans) == 2
+    assert 'boat-1' in index
@@ -0,0 +1,87 @@
+"""
+Resume of crawl from durable queue after crash of spider.
+
+Tasks are taken from queue and passed to handlers of spider as grab does
+it, pages are loaded from stub server without network.
+"""
+from urllib.parse import urlsplit
+
+from grab import Grab
+
+from storage.sinks import FileSink
+from tests.crawling import ITEMS, make_spider, saved_ids
+
+
+def document(server, url):
+    """Grab with page of stub server"""
+    parts = urlsplit(url)
+    key = parts.path + ('?' + parts.query if parts.query else '')
+    if parts.path == '/en/b/' and not parts.query:
+        key = '/en/b/?page=1'
+    grab = Grab(document_body=server.pages[key].encode('utf-8'))
+    grab.doc.url = url
+    return grab
+
+
+def process(spider, server, limit=None):
+    """Process tasks of durable queue (no more than limit). Returns
+    number of processed tasks"""
+    processed = 0
+    while limit is None or processed < limit:
+        if not spider.task_queue.size():
+            break
+        task = spider.task_queue.get()
+        handler = getattr(spider, 'task_%s' % task.name)
+        for new_task in handler(document(server, task.url), task) or []:
+            spider.task_queue.put(new_task, 100)
+        # See MySpider.process_network_result
+        if not task.get('done_by'):
+            spider.task_done(task)
+        processed += 1
+    return processed
+
+
+def start(spider):
+    spider.prepare()
+    for task in spider.task_generator():
+        spider.task_queue.put(task, 100)
+
+
+def test_crawl_is_resumed_in_parallel_discovery(config, server):
+    config.update(durablequeue=True, discovery='parallel', discoverywindow=2)
+    first = make_spider(config)
+    start(first)
+    # Spider is stopped after initial page and some of listing pages
+    process(first, server, limit=3)
+    first.shutdown()
+    resumed = len(saved_ids(config))
+    assert resumed < ITEMS
+
+    second = make_spider(config)
+    start(second)
+    assert second.task_queue.resumed
+    assert process(second, server) > 0
+    second.shutdown()
+    assert len(saved_ids(config)) == ITEMS
+
+
+def test_tasks_of_unsaved_items_are_resumed(config, server, monkeypatch):
+    def write_batch(self, items):
+        raise OSError("No space left on device")
+
+    config.update(durablequeue=True)
+    monkeypatch.setattr(FileSink, 'write_batch', write_batch)
+    first = make_spider(config)
+    start(first)
+    process(first, server)
+    first.shutdown()
+    assert saved_ids(config) == set()
+
+    monkeypatch.undo()
+    second = make_spider(config)
+    start(second)
+    assert second.task_queue.resumed == ITEMS
+    process(second, server)
+    second.shutdown()
+    assert len(saved_ids(config)) == ITEMS
+    assert not second.task_queue.size()
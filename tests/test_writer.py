@@ -0,0 +1,64 @@
+"""
+Durability of results: id gets into index (and its snapshot) only when
+item has been written by sink.
+"""
+from os import path
+
+import pytest
+
+from storage.sinks import FileSink, make_sink
+
+from tests.crawling import ITEMS, crawl, saved_ids
+
+
+def read_snapshot(config):
+    filename = path.join(config['dirresults'], config['indexfile'])
+    with open(filename) as file:
+        return set(line.strip() for line in file if line.strip())
+
+
+def test_failed_batch_is_not_indexed(config, monkeypatch):
+    def write_batch(self, items):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(FileSink, 'write_batch', write_batch)
+    crawl(config)
+    assert saved_ids(config) == set()
+    assert read_snapshot(config) == set()
+
+
+def test_items_of_failed_batch_are_parsed_on_next_run(config, monkeypatch):
+    write_batch = FileSink.write_batch
+    failed = []
+
+    def write_half(self, items):
+        # Every second batch fails
+        failed.append(not failed or not failed[-1])
+        if failed[-1]:
+            raise OSError("No space left on device")
+        write_batch(self, items)
+
+    config['batchsize'] = 5
+    monkeypatch.setattr(FileSink, 'write_batch', write_half)
+    crawl(config)
+    assert read_snapshot(config) == saved_ids(config)
+    assert 0 < len(saved_ids(config)) < ITEMS
+
+    monkeypatch.setattr(FileSink, 'write_batch', write_batch)
+    crawl(config)
+    assert len(saved_ids(config)) == ITEMS
+    assert read_snapshot(config) == saved_ids(config)
+
+
+@pytest.mark.parametrize('metricsfile', ['metrics.snapshot', 'metrics.json'])
+def test_metrics_file_is_not_item(config, metricsfile):
+    config['metricsfile'] = metricsfile
+    ids = set('boat-%d' % num for num in range(ITEMS))
+    crawl(config)
+    # Index is loaded from results on the first run, from snapshot after it
+    crawl(config)
+    assert path.exists(path.join(config['dirresults'], metricsfile))
+    assert saved_ids(config) == ids
+    assert read_snapshot(config) == ids
+    assert set(file_id for file_id, _ in make_sink(config).iter_items()) \
+        == ids